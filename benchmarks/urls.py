@@ -0,0 +1,12 @@
+from django.conf.urls import patterns, url, include
+
+from idios.views import ProfileListView
+
+
+urlpatterns = patterns(
+    "",
+    url(r"^paged/$", ProfileListView.as_view(paginate_by=20), name="bench_list_paged"),
+    url(r"^paged/(?P<profile_slug>[\w\._-]+)/$", ProfileListView.as_view(paginate_by=20), name="bench_list_paged"),
+    url(r"^cursor/$", ProfileListView.as_view(paginate_by=20, cursor_pagination=True), name="bench_list_cursor"),
+    url(r"^profiles/", include("idios.urls")),
+)
@@ -0,0 +1,141 @@
+"""
+Fragment cache for rendered profile cards (``idios/profile_item.html``).
+
+Cards are cached per profile type, user and language under a version
+number that is bumped whenever the profile or its user changes, so stale
+cards are never served and no explicit deletion is needed. The cache
+backend is chosen with ``IDIOS_PROFILE_CARD_CACHE`` (``None`` disables
+caching).
+
+The same versions, and a version per profile type bumped along with any
+of its cards, identify what the profile views show for conditional GET
+(``get_profile_versions``).
+
+"""
+from __future__ import absolute_import
+
+import time
+
+from django.core.cache import get_cache
+from django.template.loader import render_to_string
+from django.utils import translation
+from django.utils.safestring import mark_safe
+
+from .utils import get_profile_model, get_user_profile, prefetch_profiles
+
+
+def get_card_cache():
+    from .conf import settings
+    if settings.IDIOS_PROFILE_CARD_CACHE is None:
+        return None
+    return get_cache(settings.IDIOS_PROFILE_CARD_CACHE)
+
+
+def new_card_version():
+    # time based so that a version key evicted from the cache never
+    # restarts at a number older cards were stored under
+    return int(time.time() * 1000)
+
+
+def card_version_key(profile_slug, user_id):
+    return "idios:card-version:{0}:{1}".format(profile_slug, user_id)
+
+
+def list_version_key(profile_slug):
+    return "idios:list-version:{0}".format(profile_slug)
+
+
+def card_key(profile_slug, user_id, version):
+    # cards contain translated labels
+    return "idios:card:{0}:{1}:{2}:{3}".format(
+        profile_slug, user_id, version, translation.get_language()
+    )
+
+
+def get_versions(cache, keys):
+    """
+    Return ``{key: version}`` for the version ``keys``, storing a new
+    version for each key not in the cache yet.
+    """
+    versions = cache.get_many(keys)
+    new_versions = dict((key, new_card_version()) for key in keys if key not in versions)
+    if new_versions:
+        cache.set_many(new_versions, None)
+        versions.update(new_versions)
+    return versions
+
+
+def get_profile_versions(profile_slugs, user_id=None):
+    """
+    Return a sorted list of the current versions of the cards of
+    ``user_id`` of the given profile types or, without ``user_id``, of
+    the profile types themselves; None if card caching is disabled.
+    """
+    cache = get_card_cache()
+    if cache is None:
+        return None
+    if user_id is None:
+        keys = [list_version_key(slug) for slug in profile_slugs]
+    else:
+        keys = [card_version_key(slug, user_id) for slug in profile_slugs]
+    return sorted(get_versions(cache, keys).items())
+
+
+def invalidate_profile_card(profile_slug, user_id):
+    """
+    Bump the card version for the profile of the given type belonging
+    to ``user_id``, and the version of that profile type.
+    """
+    cache = get_card_cache()
+    if cache is None:
+        return
+    for key in [card_version_key(profile_slug, user_id), list_version_key(profile_slug)]:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_card_version(), None)
+
+
+def render_card(user, profile):
+    return render_to_string("idios/profile_item.html", {
+        "user": user,
+        "profile": profile,
+    })
+
+
+def render_profile_cards(users, profile_model=None):
+    """
+    Return the rendered profile cards for ``users``, taking cached cards
+    from the cache and rendering the rest after a single prefetch of
+    their profiles.
+    """
+    from .conf import settings
+    if profile_model is None:
+        profile_model = get_profile_model()
+    users = list(users)
+    cache = get_card_cache()
+    if cache is None:
+        prefetch_profiles(users, [profile_model])
+        return [mark_safe(render_card(u, get_user_profile(u, profile_model))) for u in users]
+
+    slug = profile_model.profile_slug
+    version_keys = dict((u.pk, card_version_key(slug, u.pk)) for u in users)
+    versions = get_versions(cache, list(version_keys.values()))
+
+    card_keys = dict(
+        (u.pk, card_key(slug, u.pk, versions[version_keys[u.pk]])) for u in users
+    )
+    cards = cache.get_many(list(card_keys.values()))
+    misses = [u for u in users if card_keys[u.pk] not in cards]
+    if misses:
+        prefetch_profiles(misses, [profile_model])
+        rendered = {}
+        for user in misses:
+            rendered[card_keys[user.pk]] = render_card(user, get_user_profile(user, profile_model))
+        cache.set_many(rendered, settings.IDIOS_PROFILE_CARD_CACHE_TIMEOUT)
+        cards.update(rendered)
+    return [mark_safe(cards[card_keys[u.pk]]) for u in users]
+
+
+def render_profile_card(user, profile_model=None):
+    return render_profile_cards([user], profile_model)[0]
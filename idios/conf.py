@@ -27,10 +27,24 @@ class IdiosAppConf(AppConf):
     USE_USERNAME = True
     PROFILE_MODULES = []
     DEFAULT_PROFILE_MODULE = None
+    SEARCH_BACKEND = "idios.search.TokenSearchBackend"
+    PROFILE_CARD_CACHE = "default"
+    PROFILE_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+    ADDITIONAL_INFO_EXEMPTIONS = None
+    READ_DATABASE = None
+    WRITE_DATABASE = "default"
+    PRIMARY_STICKY_SECONDS = 5
+    PRIMARY_STICKY_COOKIE = "idios_primary_until"
 
     def configure_profile_base(self, value):
         if value:
             return load_path_attr(value)
 
     def configure_profile_modules(self, value):
-        return [load_path_attr(x) for x in value]
+        from .utils import build_profile_registry
+        profile_modules = [load_path_attr(x) for x in value]
+        build_profile_registry(profile_modules)
+        return profile_modules
+
+    def configure_search_backend(self, value):
+        return load_path_attr(value)
@@ -0,0 +1,71 @@
+"""
+Per-profile-type row counts kept in ``idios.models.ProfileCount``.
+
+Counts are adjusted incrementally from the ``post_save``/``post_delete``
+hooks in ``idios.models`` and recomputed by the
+``idios_reconcile_profile_counts`` management command. A profile counts
+towards its own type and every concrete profile type it inherits from,
+matching what a query on each of those models returns. Types without a
+stored count report ``None`` so callers fall back to counting rows.
+
+"""
+from django.db import transaction
+from django.db.models import F
+
+
+def profile_type_label(model):
+    return "{0}.{1}".format(model._meta.app_label, model._meta.object_name)
+
+
+def counted_models(model):
+    """
+    Return ``model`` and the concrete profile models it inherits from.
+    """
+    from .models import ProfileBase
+    return [
+        cls for cls in model.__mro__
+        if isinstance(cls, type) and issubclass(cls, ProfileBase) and not cls._meta.abstract
+    ]
+
+
+def get_profile_count(model):
+    from .models import ProfileCount
+    counts = list(
+        ProfileCount.objects.filter(
+            profile_type=profile_type_label(model)
+        ).values_list("count", flat=True)[:1]
+    )
+    # a count that drifted below zero (e.g. after loading fixtures, which
+    # the count hooks skip) is as good as none
+    if not counts or counts[0] < 0:
+        return None
+    return counts[0]
+
+
+def adjust_profile_count(model, delta, include_parents=True):
+    """
+    Add ``delta`` to the stored count of ``model`` and, unless
+    ``include_parents`` is false, of its concrete profile parents.
+    Counts not stored yet are left to reconciliation.
+    """
+    from .models import ProfileCount
+    models = counted_models(model) if include_parents else [model]
+    ProfileCount.objects.filter(
+        profile_type__in=[profile_type_label(m) for m in models]
+    ).update(count=F("count") + delta)
+
+
+def reconcile_profile_counts(models):
+    """
+    Recount the rows of each of ``models`` and store the results.
+    """
+    from .models import ProfileCount
+    counts = {}
+    for model in models:
+        label = profile_type_label(model)
+        with transaction.atomic():
+            count = model.objects.count()
+            if not ProfileCount.objects.filter(profile_type=label).update(count=count):
+                ProfileCount.objects.create(profile_type=label, count=count)
+        counts[model] = count
+    return counts
@@ -0,0 +1,103 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+
+from django.contrib.auth.models import User
+
+from idios.cache import invalidate_profile_card
+from idios.conf import settings
+from idios.counts import adjust_profile_count
+from idios.search import get_search_backend
+from idios.utils import get_profile_model, update_missing_fields_mask
+
+
+class Command(BaseCommand):
+    help = (
+        "Create missing profiles of each configured profile type in batches. "
+        "Safe to re-run: users that already have a profile are skipped."
+    )
+    args = "[profile_slug ...]"
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--batch-size",
+            type="int",
+            dest="batch_size",
+            default=1000,
+            help="Number of users checked per batch (default: 1000)."
+        ),
+        make_option(
+            "--start-after",
+            type="int",
+            dest="start_after",
+            default=0,
+            help="Only consider users with a primary key greater than this, "
+                 "to resume an interrupted run from the last reported user id."
+        ),
+    )
+
+    def get_profile_models(self, slugs):
+        if not slugs:
+            return [m for m in settings.IDIOS_PROFILE_MODULES if m is not None]
+        models = []
+        for slug in slugs:
+            model = get_profile_model(slug)
+            if model is None:
+                raise CommandError("Unknown profile type '{0}'".format(slug))
+            models.append(model)
+        return models
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        verbosity = int(options["verbosity"])
+        if batch_size < 1:
+            raise CommandError("--batch-size must be at least 1")
+        for model in self.get_profile_models(args):
+            total = self.backfill(model, batch_size, options["start_after"], verbosity)
+            self.stdout.write("{0}: created {1} profiles".format(model.profile_slug, total))
+
+    def backfill(self, model, batch_size, start_after, verbosity):
+        users = User.objects.order_by("pk").values_list("pk", flat=True)
+        last_pk, total = start_after, 0
+        while True:
+            batch = list(users.filter(pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            # only the profiles within the batch's user id range are
+            # looked at, so each batch costs the same
+            existing = set(
+                model.objects.using(router.db_for_write(model)).filter(
+                    user__gt=last_pk, user__lte=batch[-1]
+                ).values_list("user", flat=True)
+            )
+            user_ids = [pk for pk in batch if pk not in existing]
+            first_pk, last_pk = last_pk, batch[-1]
+            if not user_ids:
+                continue
+            with transaction.atomic():
+                if model._meta.parents:
+                    # bulk_create does not support multi-table inheritance
+                    for user_id in user_ids:
+                        model.objects.create(user_id=user_id)
+                else:
+                    profiles = [model(user_id=user_id) for user_id in user_ids]
+                    # bulk_create bypasses save(), which computes the mask
+                    for profile in profiles:
+                        update_missing_fields_mask(profile)
+                    model.objects.bulk_create(profiles)
+                    adjust_profile_count(model, len(user_ids))
+                    # nor does it send post_save, which indexes profiles;
+                    # the batch's existing profiles are re-indexed too
+                    get_search_backend().update_profiles(
+                        model.objects.using(router.db_for_write(model)).filter(
+                            user__gt=first_pk, user__lte=last_pk
+                        )
+                    )
+            for user_id in user_ids:
+                invalidate_profile_card(model.profile_slug, user_id)
+            total += len(user_ids)
+            if verbosity >= 1:
+                self.stdout.write("{0}: created {1} profiles (last user id {2})".format(
+                    model.profile_slug, total, last_pk
+                ))
+        return total
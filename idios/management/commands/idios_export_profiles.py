@@ -0,0 +1,62 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from idios.conf import settings
+from idios.transfer import FORMATS, iter_profile_records, write_csv, write_jsonl
+from idios.utils import get_profile_model
+
+
+class Command(BaseCommand):
+    help = "Stream profiles of the configured (or given) profile types as JSON lines or CSV."
+    args = "[profile_slug ...]"
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--format",
+            dest="format",
+            choices=FORMATS,
+            default="jsonl",
+            help="Output format: jsonl (default) or csv. CSV takes a single profile type."
+        ),
+        make_option(
+            "--output",
+            dest="output",
+            default=None,
+            help="File to write to (default: standard output)."
+        ),
+        make_option(
+            "--chunk-size",
+            type="int",
+            dest="chunk_size",
+            default=1000,
+            help="Number of profiles read from the database at a time (default: 1000)."
+        ),
+    )
+
+    def get_profile_models(self, slugs):
+        if not slugs:
+            return [m for m in settings.IDIOS_PROFILE_MODULES if m is not None]
+        models = []
+        for slug in slugs:
+            model = get_profile_model(slug)
+            if model is None:
+                raise CommandError("Unknown profile type '{0}'".format(slug))
+            models.append(model)
+        return models
+
+    def handle(self, *args, **options):
+        models = self.get_profile_models(args)
+        if options["format"] == "csv" and len(models) != 1:
+            raise CommandError("CSV export takes exactly one profile type")
+        stream = open(options["output"], "w") if options["output"] else self.stdout
+        try:
+            for model in models:
+                records = iter_profile_records(model, options["chunk_size"])
+                if options["format"] == "csv":
+                    count = write_csv(stream, model, records)
+                else:
+                    count = write_jsonl(stream, records)
+                self.stderr.write("{0}: exported {1} profiles".format(model.profile_slug, count))
+        finally:
+            if stream is not self.stdout:
+                stream.close()
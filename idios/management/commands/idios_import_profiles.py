@@ -0,0 +1,51 @@
+import sys
+
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from idios.transfer import FORMATS, import_profile_records, read_csv, read_jsonl
+from idios.utils import get_profile_registry
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update profiles from a JSON lines or CSV file written by "
+        "idios_export_profiles. Profiles are matched to users by username."
+    )
+    args = "<file>"
+    option_list = BaseCommand.option_list + (
+        make_option(
+            "--format",
+            dest="format",
+            choices=FORMATS,
+            default="jsonl",
+            help="Input format: jsonl (default) or csv."
+        ),
+        make_option(
+            "--chunk-size",
+            type="int",
+            dest="chunk_size",
+            default=1000,
+            help="Number of profiles written per transaction (default: 1000)."
+        ),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError("Give the file to import, or - for standard input")
+        stream = sys.stdin if args[0] == "-" else open(args[0])
+        try:
+            if options["format"] == "csv":
+                records = read_csv(stream)
+            else:
+                records = read_jsonl(stream)
+            created, updated, skipped = import_profile_records(
+                get_profile_registry(), records, options["chunk_size"]
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stdout.write("Created {0}, updated {1}, skipped {2} profiles".format(
+            created, updated, skipped
+        ))
@@ -0,0 +1,10 @@
+from django.core.management.base import NoArgsCommand
+
+from idios.search import get_search_backend
+
+
+class Command(NoArgsCommand):
+    help = "Rebuild the profile search index of the configured IDIOS_SEARCH_BACKEND."
+
+    def handle_noargs(self, **options):
+        get_search_backend().rebuild()
@@ -0,0 +1,17 @@
+from django.core.management.base import NoArgsCommand
+
+from idios.conf import settings
+from idios.counts import reconcile_profile_counts
+from idios.utils import get_profile_base
+
+
+class Command(NoArgsCommand):
+    help = "Recount the profiles of each profile type used for list pagination."
+
+    def handle_noargs(self, **options):
+        models = [m for m in settings.IDIOS_PROFILE_MODULES if m is not None]
+        base = get_profile_base()
+        if base not in models:
+            models.append(base)
+        for model, count in reconcile_profile_counts(models).items():
+            self.stdout.write("{0}: {1} profiles".format(model.profile_slug, count))
@@ -1,56 +1,89 @@
 import re
 
 from django import forms
-from django.db import models
 from django.template import RequestContext
 from django.shortcuts import render_to_response, redirect
 from django.views.decorators.csrf import csrf_protect
 
 from .conf import settings
+from .routers import pin_primary
+from .utils import get_missing_fields, get_real_model, get_required_fields
+
+
+def compile_exemptions(exemptions=None):
+    """
+    Combine the path patterns in ``exemptions`` (by default the
+    ``IDIOS_ADDITIONAL_INFO_EXEMPTIONS`` setting, or when that is
+    ``None`` the media and static URLs, ``/__debug__`` and
+    ``/account``) into one regular expression matched against the
+    start of the request path.
+    """
+    if exemptions is None:
+        exemptions = settings.IDIOS_ADDITIONAL_INFO_EXEMPTIONS
+    if exemptions is None:
+        exemptions = [
+            re.escape(url) for url in [settings.MEDIA_URL, settings.STATIC_URL] if url
+        ]
+        exemptions.extend([
+            r"/__debug__",
+            r"/account",  # @@@ hack for now
+        ])
+    if not exemptions:
+        return None
+    return re.compile("|".join("(?:{0})".format(e) for e in exemptions))
 
 
 class AdditionalInfoMiddleware(object):
 
+    def __init__(self):
+        self.exemptions = compile_exemptions()
+
     def process_request(self, request):
-        exemptions = [
-            r"^%s" % settings.MEDIA_URL,
-            r"^%s" % settings.STATIC_URL,
-            r"^/__debug__",
-            r"^/account",  # @@@ hack for now
-        ]
-        for exemption in exemptions:
-            if re.match(exemption, request.path):
-                return None
+        # the kickstart flag lives in the session, so requests without a
+        # session cookie can't carry it; don't load a session to find out
+        if settings.SESSION_COOKIE_NAME not in request.COOKIES:
+            return None
+        if self.exemptions is not None and self.exemptions.match(request.path):
+            return None
         kickstart = request.session.get("idios_additional_info_kickstart")
         if kickstart:
             return handle_additional_info(request)
 
 
+# {(profile model, missing field names): form class}
+_additional_info_form_cache = {}
+
+
+def get_additional_info_form(profile, missing_fields):
+    """
+    Return the form class asking for ``missing_fields`` of ``profile``,
+    built once per profile model and set of missing fields.
+    """
+    model = get_real_model(type(profile))
+    key = (model, tuple(missing_fields))
+    try:
+        return _additional_info_form_cache[key]
+    except KeyError:
+        pass
+    attrs = {}
+    for name, db_field, form_field, is_text in get_required_fields(profile):
+        if name in missing_fields:
+            attrs[name] = form_field
+    form_class = type("AdditionalInfoForm", (forms.Form,), attrs)
+    _additional_info_form_cache[key] = form_class
+    return form_class
+
+
 @csrf_protect
 def handle_additional_info(request):
     if request.user.is_authenticated():
+        # the profile is read to be written, so never from a lagging replica
+        pin_primary(request, sticky=False)
         profile = request.user.get_profile()
-        missing_fields = []
-        # look for fields which are required on the model
-        for field in profile.idios_required_fields():
-            name = isinstance(field, tuple) and field[0] or field
-            db_field = profile._meta.get_field(name)
-            value = getattr(profile, db_field.attname)
-            if isinstance(db_field, (models.CharField, models.TextField)):
-                missing = not value
-            else:
-                missing = value is None
-            if missing:
-                if not isinstance(field, tuple):
-                    missing_fields.append((field, db_field.formfield()))
-                else:
-                    missing_fields.append(field)
+        missing_fields = get_missing_fields(profile)
         if not missing_fields:
             return None
-        attrs = {}
-        for field in missing_fields:
-            attrs[field[0]] = field[1]
-        AdditionalInfoForm = type("AdditionalInfoForm", (forms.Form,), attrs)
+        AdditionalInfoForm = get_additional_info_form(profile, missing_fields)
         if request.method == "POST":
             form = AdditionalInfoForm(request.POST, request.FILES)
             if form.is_valid():
@@ -58,6 +91,7 @@ def handle_additional_info(request):
                 for field, value in form.cleaned_data.iteritems():
                     setattr(profile, field, value)
                 profile.save()
+                pin_primary(request)
                 return redirect(request.path)
         else:
             form = AdditionalInfoForm()
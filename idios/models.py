@@ -1,13 +1,23 @@
-from django.core.urlresolvers import reverse
-from django.db import models
-from django.db.models.signals import post_save
+import threading
+
+from contextlib import contextmanager
+
+from django.db import IntegrityError, models, transaction
+from django.db.models.signals import post_save, post_delete
 from django.utils.translation import ugettext_lazy as _
 
 from django.contrib.auth.models import User
 
 from account.signals import user_logged_in
 
-from .utils import get_profile_model, get_profile_form
+from .cache import invalidate_profile_card
+from .counts import adjust_profile_count
+from .search import get_search_backend
+from .urlbuilder import get_url_builder
+from .utils import (
+    get_missing_fields, get_profile_model, get_profile_form, get_real_model,
+    get_required_fields_key, update_missing_fields_mask
+)
 
 
 class ClassProperty(property):
@@ -16,11 +26,34 @@ class ClassProperty(property):
         return self.fget.__get__(None, owner)()
 
 
+# fields save() computes from the others
+MASK_FIELDS = ["missing_fields_mask", "missing_fields_key"]
+
+
 class ProfileBase(models.Model):
 
     # @@@ could be unique=True if subclasses don't inherit a concrete base class
     # @@@ need to look at this more
     user = models.ForeignKey(User, verbose_name=_("user"))
+    # bitmask of the idios_required_fields() without a value, computed on
+    # save (see idios.utils.get_missing_fields_mask); NULL until first saved.
+    # missing_fields_key identifies the list of required fields the mask
+    # was computed for; a mask with another key is stale and not trusted
+    missing_fields_mask = models.IntegerField(null=True, editable=False, db_index=True)
+    missing_fields_key = models.IntegerField(null=True, editable=False)
+    modified = models.DateTimeField(_("modified"), auto_now=True, db_index=True)
+
+    # query plan used by ProfileListView: the relations to join and the
+    # fields to load ("__all__", the default, for every field; "__item__"
+    # for the user columns and the fields idios/profile_item.html renders;
+    # or a list of field names). With a projection, any other field a
+    # profiles.html template renders costs a query per profile.
+    list_select_related = ["user"]
+    list_fields = "__all__"
+    list_item_fields = ["name", "about", "location", "website"]
+
+    # save() only writes changed fields (see get_changed_fields)
+    track_changes = True
 
     class Meta:
         verbose_name = _("profile")
@@ -30,40 +63,247 @@ class ProfileBase(models.Model):
     def __unicode__(self):
         return self.user.username
 
+    def __init__(self, *args, **kwargs):
+        super(ProfileBase, self).__init__(*args, **kwargs)
+        self._snapshot_fields()
+
+    def _snapshot_fields(self):
+        self._loaded_values = dict(
+            (f.attname, self.__dict__[f.attname])
+            for f in self._meta.concrete_fields if f.attname in self.__dict__
+        )
+
+    def get_changed_fields(self):
+        """
+        Return the names of the fields changed since the profile was
+        loaded or last saved. Deferred fields that were never set are
+        not considered changed.
+        """
+        changed = []
+        for f in self._meta.concrete_fields:
+            if f.primary_key or f.attname not in self.__dict__:
+                continue
+            if f.attname not in self._loaded_values or self.__dict__[f.attname] != self._loaded_values[f.attname]:
+                changed.append(f.name)
+        return changed
+
+    def save(self, *args, **kwargs):
+        """
+        Save the profile. With ``track_changes`` on (the default), saving
+        an existing profile to the database it was loaded from, without
+        ``update_fields``, ``force_insert`` or ``force_update``, only
+        writes the fields changed since it was loaded, and does not
+        query at all when nothing changed.
+        """
+        update_missing_fields_mask(self)
+        update_fields = kwargs.get("update_fields")
+        # a save to another database may have to insert the row there
+        using = kwargs.get("using")
+        tracked = (
+            self.track_changes and not args and update_fields is None and
+            not kwargs.get("force_insert") and not kwargs.get("force_update") and
+            not self._state.adding and self.pk is not None and
+            (using is None or using == self._state.db)
+        )
+        if tracked:
+            # the mask of a profile loaded without it counts as changed
+            # once computed, but only changes along with other fields
+            update_fields = [
+                f for f in self.get_changed_fields()
+                if f != "modified" and (f not in MASK_FIELDS or f in self._loaded_values)
+            ]
+            if not update_fields:
+                return
+        if update_fields:
+            extra = [f for f in MASK_FIELDS + ["modified"] if f not in update_fields]
+            kwargs["update_fields"] = list(update_fields) + extra
+        super(ProfileBase, self).save(*args, **kwargs)
+        self._snapshot_fields()
+
+    def idios_required_fields(self):
+        """
+        Return the fields the additional info middleware asks for while
+        they have no value: field names, or ``(name, form field)`` pairs.
+        """
+        return []
+
+    @property
+    def is_complete(self):
+        return not get_missing_fields(self)
+
+    @classmethod
+    def incomplete_profiles(cls):
+        """
+        Return the profiles missing any required field, as of their
+        last save, and those whose completeness is unknown because their
+        mask was never computed (NULL) or was computed for a different
+        list of required fields.
+        """
+        return cls.objects.filter(
+            models.Q(missing_fields_mask__gt=0) | models.Q(missing_fields_mask__isnull=True) |
+            models.Q(missing_fields_key__isnull=True) |
+            ~models.Q(missing_fields_key=get_required_fields_key(cls()))
+        )
+
     def get_absolute_url(self):
-        from .conf import settings
-        if len(settings.IDIOS_PROFILE_MODULES) > 1:
-            # @@@ using PK here is kind of ugly. the alternative is to
-            # generate a unique slug for each profile, which is tricky
-            kwargs = {
-                "profile_slug": self.profile_slug,
-                "pk": self.pk
-            }
-        else:
-            if settings.IDIOS_USE_USERNAME:
-                kwargs = {"username": self.user.username}
-            else:
-                kwargs = {"pk": self.pk}
-        return reverse("profile_detail", kwargs=kwargs)
+        # @@@ with multiple profile types the URL uses the PK, which is kind
+        # of ugly. the alternative is to generate a unique slug for each
+        # profile, which is tricky
+        return get_url_builder(type(self))(self)
+
+    @classmethod
+    def get_list_fields(cls):
+        if cls.list_fields is None or cls.list_fields == "__all__":
+            return None
+        if cls.list_fields != "__item__":
+            return list(cls.list_fields)
+        names = set(f.name for f in cls._meta.fields)
+        fields = ["user", "user__username", "user__date_joined"]
+        fields.extend(name for name in cls.list_item_fields if name in names)
+        return fields
 
     @classmethod
-    def get_form(cls):
-        return get_profile_form(cls)
+    def get_form(cls, exclude=None, fields=None):
+        return get_profile_form(cls, exclude=exclude, fields=fields)
 
     def _default_profile_slug(cls):
-        return cls._meta.module_name
+        return get_real_model(cls)._meta.module_name
 
     profile_slug = ClassProperty(classmethod(_default_profile_slug))
 
 
-def create_profile(sender, instance=None, **kwargs):
-    if instance is None:
+class ProfileSearchToken(models.Model):
+    """
+    A normalized search token for a user, maintained by
+    ``idios.search.TokenSearchBackend``.
+    """
+
+    user = models.ForeignKey(User, related_name="idios_search_tokens")
+    token = models.CharField(max_length=100, db_index=True)
+
+    class Meta:
+        unique_together = [("user", "token")]
+
+    def __unicode__(self):
+        return self.token
+
+
+def update_search_index(sender, instance=None, update_fields=None, **kwargs):
+    if isinstance(instance, User):
+        if update_fields is None or "username" in update_fields:
+            get_search_backend().update_user(instance)
+    elif isinstance(instance, ProfileBase):
+        get_search_backend().update_profile(instance)
+post_save.connect(update_search_index)
+
+
+def remove_from_search_index(sender, instance=None, **kwargs):
+    if isinstance(instance, ProfileBase):
+        get_search_backend().remove_profile(instance)
+post_delete.connect(remove_from_search_index)
+
+
+CARD_USER_FIELDS = set(["username", "first_name", "last_name"])
+
+
+def invalidate_profile_cards(sender, instance=None, update_fields=None, **kwargs):
+    from .conf import settings
+    if isinstance(instance, User):
+        # only the user fields rendered on a card matter
+        if update_fields is not None and not CARD_USER_FIELDS.intersection(update_fields):
+            return
+        for model in settings.IDIOS_PROFILE_MODULES:
+            if model is not None:
+                invalidate_profile_card(model.profile_slug, instance.pk)
+    elif isinstance(instance, ProfileBase):
+        slugs = set(
+            cls.profile_slug for cls in get_real_model(type(instance)).__mro__
+            if issubclass(cls, ProfileBase) and not cls._meta.abstract
+        )
+        for slug in slugs:
+            invalidate_profile_card(slug, instance.user_id)
+post_save.connect(invalidate_profile_cards)
+post_delete.connect(invalidate_profile_cards)
+
+
+class ProfileCount(models.Model):
+    """
+    The number of profiles of one profile type, maintained by
+    ``idios.counts``.
+    """
+
+    profile_type = models.CharField(max_length=100, unique=True)
+    # not positive: decrements of a drifted count must not fail deletes
+    count = models.IntegerField(default=0)
+
+    def __unicode__(self):
+        return u"{0}: {1}".format(self.profile_type, self.count)
+
+
+def count_created_profile(sender, instance=None, created=False, raw=False, **kwargs):
+    if created and not raw and isinstance(instance, ProfileBase):
+        adjust_profile_count(get_real_model(type(instance)), 1)
+post_save.connect(count_created_profile)
+
+
+def count_deleted_profile(sender, instance=None, **kwargs):
+    # parent rows of multi-table inheritance send their own post_delete
+    if isinstance(instance, ProfileBase):
+        adjust_profile_count(get_real_model(type(instance)), -1, include_parents=False)
+post_delete.connect(count_deleted_profile)
+
+
+_profile_creation = threading.local()
+
+
+@contextmanager
+def skip_profile_creation():
+    """
+    Context manager disabling automatic profile creation for users
+    created inside it, e.g. during bulk user imports (profiles can be
+    created afterwards in bulk).
+    """
+    previous = getattr(_profile_creation, "skip", False)
+    _profile_creation.skip = True
+    try:
+        yield
+    finally:
+        _profile_creation.skip = previous
+
+
+def create_profile(sender, instance=None, created=False, raw=False, **kwargs):
+    if instance is None or not created or raw:
         return
-    profile, created = get_profile_model().objects.get_or_create(user=instance)
+    if getattr(_profile_creation, "skip", False):
+        return
+    # insert-or-ignore: if the profile model has a unique constraint on
+    # user, a profile created concurrently by someone else is left alone
+    try:
+        with transaction.atomic():
+            get_profile_model().objects.create(user=instance)
+    except IntegrityError:
+        pass
 post_save.connect(create_profile, sender=User)
 
 
 def additional_info_kickstart(sender, **kwargs):
     request = kwargs.get("request")
-    request.session["idios_additional_info_kickstart"] = True
+    user = kwargs.get("user") or request.user
+    # only the stored completeness mask is read; the flag (and with it a
+    # session write) is only set when something is actually missing
+    profile_model = get_profile_model()
+    masks = list(
+        profile_model.objects.filter(user=user).values_list(
+            "missing_fields_mask", "missing_fields_key"
+        )[:1]
+    )
+    if not masks:
+        return
+    mask, key = masks[0]
+    if mask is None or key != get_required_fields_key(profile_model()):
+        missing = bool(get_missing_fields(profile_model.objects.filter(user=user)[0]))
+    else:
+        missing = mask != 0
+    if missing:
+        request.session["idios_additional_info_kickstart"] = True
 user_logged_in.connect(additional_info_kickstart)
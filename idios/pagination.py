@@ -0,0 +1,144 @@
+"""
+Keyset (cursor) pagination for profile lists.
+
+Rather than skipping ``OFFSET`` rows, each page is fetched by seeking
+past the ordering key of the last row on the previous page, so every
+page costs the same index lookup regardless of how deep it is. Cursors
+are opaque, URL-safe strings encoding the direction of travel and the
+ordering key (ordering column value plus primary key) to seek from.
+
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, value, pk):
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    data = json.dumps([direction, value, pk])
+    return base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        cursor = str(cursor)
+        cursor += "=" * (-len(cursor) % 4)
+        data = base64.urlsafe_b64decode(cursor.encode("ascii"))
+        direction, value, pk = json.loads(data.decode("utf-8"))
+    except (TypeError, ValueError, UnicodeError):
+        raise InvalidCursor(cursor)
+    if direction not in ("next", "previous"):
+        raise InvalidCursor(cursor)
+    return direction, value, pk
+
+
+def resolve_field(model, path):
+    """
+    Return the model field at the end of a ``__`` separated lookup
+    path starting from ``model``.
+    """
+    parts = path.split("__")
+    for part in parts[:-1]:
+        model = model._meta.get_field(part).rel.to
+    if parts[-1] == "pk":
+        return model._meta.pk
+    return model._meta.get_field(parts[-1])
+
+
+def resolve_value(obj, path):
+    for part in path.split("__"):
+        obj = getattr(obj, part)
+    return obj
+
+
+class CursorPaginator(object):
+    """
+    Paginate ``queryset`` in pages of ``per_page`` rows ordered by
+    ``ordering``, a ``(field, "pk")`` pair where either may be prefixed
+    with ``-`` for descending order. Both members must sort in the same
+    direction.
+    """
+
+    def __init__(self, queryset, per_page, ordering):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = ordering
+        self.field = ordering[0].lstrip("-")
+        self.descending = ordering[0].startswith("-")
+
+    def _seek(self, queryset, value, pk, forwards):
+        after = forwards != self.descending
+        op = "gt" if after else "lt"
+        return queryset.filter(
+            Q(**{"{0}__{1}".format(self.field, op): value}) |
+            Q(**{self.field: value, "pk__{0}".format(op): pk})
+        )
+
+    def _reversed_ordering(self):
+        return [o[1:] if o.startswith("-") else "-" + o for o in self.ordering]
+
+    def page(self, cursor=None):
+        """
+        Return ``(object_list, previous_cursor, next_cursor)`` for the
+        page identified by ``cursor`` (the first page if ``None``).
+        Raise ``InvalidCursor`` if the cursor cannot be decoded or holds
+        values of the wrong type.
+        """
+        queryset = self.queryset
+        direction = "next"
+        if cursor:
+            direction, value, pk = decode_cursor(cursor)
+            try:
+                value = resolve_field(queryset.model, self.field).to_python(value)
+                pk = queryset.model._meta.pk.to_python(pk)
+                queryset = self._seek(queryset, value, pk, direction == "next")
+            except Exception:
+                raise InvalidCursor(cursor)
+        if direction == "next":
+            queryset = queryset.order_by(*self.ordering)
+        else:
+            queryset = queryset.order_by(*self._reversed_ordering())
+        object_list = list(queryset[:self.per_page + 1])
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == "previous":
+            object_list.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = bool(cursor), has_more
+        previous_cursor = next_cursor = None
+        if object_list:
+            first, last = object_list[0], object_list[-1]
+            if has_previous:
+                previous_cursor = encode_cursor(
+                    "previous", resolve_value(first, self.field), first.pk
+                )
+            if has_next:
+                next_cursor = encode_cursor(
+                    "next", resolve_value(last, self.field), last.pk
+                )
+        return object_list, previous_cursor, next_cursor
+
+    def iter_values(self, *fields):
+        """
+        Yield a ``values()`` dict of ``fields`` for every row, in order,
+        fetching ``per_page`` rows per query by seeking past the last
+        row of the previous chunk, so only one chunk is held in memory
+        even with database drivers that buffer whole result sets.
+        """
+        names = list(fields) + [name for name in (self.field, "pk") if name not in fields]
+        queryset = self.queryset.order_by(*self.ordering).values(*names)
+        chunk = list(queryset[:self.per_page])
+        while chunk:
+            for row in chunk:
+                yield dict((name, row[name]) for name in fields)
+            if len(chunk) < self.per_page:
+                break
+            last = chunk[-1]
+            chunk = list(self._seek(queryset, last[self.field], last["pk"], True)[:self.per_page])
@@ -0,0 +1,111 @@
+"""
+Read-replica routing for idios.
+
+``IdiosRouter`` sends reads of profile models to the database named by
+``IDIOS_READ_DATABASE``, and their writes, as well as all queries of
+idios' own models, to ``IDIOS_WRITE_DATABASE``. After a profile is created or edited through
+the idios views, ``ReplicaPinningMiddleware`` keeps that client's reads
+on the write database for ``IDIOS_PRIMARY_STICKY_SECONDS`` so it reads
+its own writes despite replication lag. Enable with::
+
+    DATABASE_ROUTERS = ["idios.routers.IdiosRouter"]
+    MIDDLEWARE_CLASSES = [
+        # ...
+        "idios.routers.ReplicaPinningMiddleware",
+    ]
+
+"""
+import threading
+import time
+
+from django.core.signals import request_finished, request_started
+
+
+_state = threading.local()
+
+
+def is_pinned():
+    return getattr(_state, "pinned", False)
+
+
+def set_pinned(pinned):
+    _state.pinned = pinned
+
+
+def unpin(**kwargs):
+    # a pin never outlives the request it was set in, middleware or not
+    set_pinned(False)
+request_started.connect(unpin)
+request_finished.connect(unpin)
+
+
+def pin_primary(request, sticky=True):
+    """
+    Route reads to the write database for the rest of ``request`` and,
+    unless ``sticky`` is false, through a cookie set by
+    ``ReplicaPinningMiddleware``, for the client's requests in the next
+    ``IDIOS_PRIMARY_STICKY_SECONDS``.
+    """
+    set_pinned(True)
+    if sticky:
+        request._idios_pin_primary = True
+
+
+def is_bookkeeping_model(model):
+    return model._meta.app_label == "idios"
+
+
+def is_idios_model(model):
+    from .models import ProfileBase
+    return issubclass(model, ProfileBase) or is_bookkeeping_model(model)
+
+
+class IdiosRouter(object):
+
+    def db_for_read(self, model, **hints):
+        from .conf import settings
+        if settings.IDIOS_READ_DATABASE is None or not is_idios_model(model):
+            return None
+        # idios' own tables (search tokens, counts) are read to decide
+        # what to write, which a lagging replica would get wrong
+        if is_pinned() or is_bookkeeping_model(model):
+            return settings.IDIOS_WRITE_DATABASE
+        return settings.IDIOS_READ_DATABASE
+
+    def db_for_write(self, model, **hints):
+        from .conf import settings
+        if settings.IDIOS_READ_DATABASE is None or not is_idios_model(model):
+            return None
+        return settings.IDIOS_WRITE_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        from .conf import settings
+        if settings.IDIOS_READ_DATABASE is None:
+            return None
+        aliases = set([settings.IDIOS_READ_DATABASE, settings.IDIOS_WRITE_DATABASE])
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaPinningMiddleware(object):
+
+    def process_request(self, request):
+        from .conf import settings
+        until = request.COOKIES.get(settings.IDIOS_PRIMARY_STICKY_COOKIE)
+        try:
+            set_pinned(until is not None and float(until) > time.time())
+        except ValueError:
+            set_pinned(False)
+
+    def process_response(self, request, response):
+        from .conf import settings
+        if getattr(request, "_idios_pin_primary", False):
+            seconds = settings.IDIOS_PRIMARY_STICKY_SECONDS
+            response.set_cookie(
+                settings.IDIOS_PRIMARY_STICKY_COOKIE,
+                str(time.time() + seconds),
+                max_age=seconds,
+                httponly=True,
+            )
+        return response
@@ -0,0 +1,249 @@
+"""
+Pluggable search backends for profile lists.
+
+The backend used by ``ProfileListView`` is chosen with the
+``IDIOS_SEARCH_BACKEND`` setting. Backends narrow a profile queryset
+down to the profiles matching the given search terms and keep their
+index up to date from the ``post_save``/``post_delete`` hooks in
+``idios.models``.
+
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, router
+
+from .utils import get_real_model
+
+
+_word_re = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """
+    Split ``text`` into lowercased search tokens.
+    """
+    return [word.lower() for word in _word_re.findall(text or "")]
+
+
+class BaseSearchBackend(object):
+
+    def filter(self, queryset, search_terms):
+        """
+        Return ``queryset`` narrowed down to the profiles matching
+        ``search_terms``.
+        """
+        raise NotImplementedError
+
+    def update_user(self, user):
+        pass
+
+    def update_profile(self, profile):
+        pass
+
+    def remove_profile(self, profile):
+        pass
+
+    def update_profiles(self, queryset):
+        """
+        Index the profiles in ``queryset``, e.g. after creating them with
+        ``bulk_create``, which sends no ``post_save``.
+        """
+        pass
+
+    def rebuild(self):
+        """
+        Re-index every user and profile from scratch.
+        """
+        pass
+
+
+class UsernameSearchBackend(BaseSearchBackend):
+    """
+    Unindexed ``icontains`` match on the username; the behaviour of
+    idios before search backends were introduced.
+    """
+
+    def filter(self, queryset, search_terms):
+        return queryset.filter(user__username__icontains=search_terms)
+
+
+class TokenSearchBackend(BaseSearchBackend):
+    """
+    Prefix match of each search word against the tokens of the
+    username, stored normalized in ``idios.models.ProfileSearchToken``.
+    Every word has to match for a profile to be returned.
+    """
+
+    def filter(self, queryset, search_terms):
+        from .models import ProfileSearchToken
+        for word in tokenize(search_terms):
+            user_ids = ProfileSearchToken.objects.filter(
+                token__startswith=word
+            ).values("user")
+            queryset = queryset.filter(user__in=user_ids)
+        return queryset
+
+    def user_tokens(self, user):
+        tokens = set(tokenize(user.username))
+        tokens.add(user.username.lower())
+        return tokens
+
+    def update_user(self, user):
+        from .models import ProfileSearchToken
+        tokens = self.user_tokens(user)
+        existing = set(
+            ProfileSearchToken.objects.filter(user=user).values_list("token", flat=True)
+        )
+        if existing - tokens:
+            ProfileSearchToken.objects.filter(user=user, token__in=existing - tokens).delete()
+        if tokens - existing:
+            ProfileSearchToken.objects.bulk_create([
+                ProfileSearchToken(user=user, token=token) for token in tokens - existing
+            ])
+
+    def rebuild(self):
+        from django.contrib.auth.models import User
+        from .models import ProfileSearchToken
+        ProfileSearchToken.objects.all().delete()
+        for user in User.objects.only("pk", "username").iterator():
+            ProfileSearchToken.objects.bulk_create([
+                ProfileSearchToken(user=user, token=token)
+                for token in self.user_tokens(user)
+            ])
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """
+    Full-text search using an SQLite FTS5 virtual table covering the
+    username and the text fields listed in ``fields`` (where the
+    profile model has them). Each search word is matched as a prefix.
+    """
+
+    table = "idios_profile_fts"
+    fields = ["name", "about", "location"]
+
+    def __init__(self):
+        self._tables = set()
+
+    def get_profile_models(self):
+        from .conf import settings
+        from .utils import get_profile_base
+        models = [m for m in settings.IDIOS_PROFILE_MODULES if m is not None]
+        base = get_profile_base()
+        if base not in models:
+            models.append(base)
+        return models
+
+    def label(self, model):
+        return "{0}.{1}".format(model._meta.app_label, model._meta.object_name)
+
+    def connection(self, model):
+        alias = router.db_for_write(model)
+        connection = connections[alias]
+        if connection.vendor != "sqlite":
+            raise ImproperlyConfigured(
+                "SQLiteFTSSearchBackend requires an SQLite database"
+            )
+        if alias not in self._tables:
+            connection.cursor().execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS {0} USING fts5("
+                "profile_type UNINDEXED, profile_id UNINDEXED, user_id UNINDEXED, "
+                "username, {1})".format(self.table, ", ".join(self.fields))
+            )
+            self._tables.add(alias)
+        return connection
+
+    def cursor(self, model):
+        return self.connection(model).cursor()
+
+    def match_query(self, search_terms):
+        return " ".join('"{0}"*'.format(word) for word in tokenize(search_terms))
+
+    def filter(self, queryset, search_terms):
+        query = self.match_query(search_terms)
+        if not query:
+            return queryset
+        labels = [
+            self.label(model) for model in self.get_profile_models()
+            if issubclass(model, queryset.model)
+        ]
+        labels.append(self.label(queryset.model))
+        # matched in a subquery so the ids never travel through Python
+        # (nor hit SQLite's limit on the number of query parameters)
+        qn = self.connection(queryset.model).ops.quote_name
+        opts = queryset.model._meta
+        return queryset.extra(
+            where=[
+                "{0}.{1} IN (SELECT profile_id FROM {2} WHERE {2} MATCH %s "
+                "AND profile_type IN ({3}))".format(
+                    qn(opts.db_table), qn(opts.pk.column), self.table,
+                    ", ".join(["%s"] * len(labels))
+                )
+            ],
+            params=[query] + labels
+        )
+
+    def _insert(self, cursor, profile):
+        values = [getattr(profile, field, "") or "" for field in self.fields]
+        cursor.execute(
+            "INSERT INTO {0} (profile_type, profile_id, user_id, username, {1}) "
+            "VALUES (%s, %s, %s, %s, {2})".format(
+                self.table, ", ".join(self.fields), ", ".join(["%s"] * len(self.fields))
+            ),
+            [self.label(get_real_model(type(profile))), profile.pk, profile.user_id, profile.user.username] + values
+        )
+
+    def update_user(self, user):
+        cursor = self.cursor(type(user))
+        cursor.execute(
+            "UPDATE {0} SET username = %s WHERE user_id = %s".format(self.table),
+            [user.username, user.pk]
+        )
+
+    def update_profile(self, profile):
+        self.remove_profile(profile)
+        self._insert(self.cursor(type(profile)), profile)
+
+    def update_profiles(self, queryset):
+        for profile in queryset.select_related("user").iterator():
+            self.update_profile(profile)
+
+    def remove_profile(self, profile):
+        cursor = self.cursor(type(profile))
+        cursor.execute(
+            "DELETE FROM {0} WHERE profile_type = %s AND profile_id = %s".format(self.table),
+            [self.label(get_real_model(type(profile))), profile.pk]
+        )
+
+    def rebuild(self):
+        models = self.get_profile_models()
+        for model in models:
+            cursor = self.cursor(model)
+            cursor.execute(
+                "DELETE FROM {0} WHERE profile_type = %s".format(self.table),
+                [self.label(model)]
+            )
+            profiles = model.objects.select_related("user")
+            # rows of more specific profile types are indexed under their own type
+            for other in models:
+                if other is not model and issubclass(other, model):
+                    profiles = profiles.exclude(pk__in=other.objects.values("pk"))
+            for profile in profiles.iterator():
+                self._insert(cursor, profile)
+
+
+_search_backend = None
+
+
+def get_search_backend():
+    """
+    Return the search backend instance configured by the
+    ``IDIOS_SEARCH_BACKEND`` setting.
+    """
+    global _search_backend
+    from .conf import settings
+    backend_class = settings.IDIOS_SEARCH_BACKEND
+    if type(_search_backend) is not backend_class:
+        _search_backend = backend_class()
+    return _search_backend
@@ -1,12 +1,27 @@
 from django import template
 
+from ..cache import render_profile_card, render_profile_cards
+
 
 register = template.Library()
 
 
-@register.inclusion_tag("idios/profile_item.html")
+@register.simple_tag
 def show_profile(user):
-    return {"user": user}
+    """
+    Render ``idios/profile_item.html`` for ``user``, served from the
+    profile card cache when possible.
+    """
+    return render_profile_card(user)
+
+
+@register.inclusion_tag("idios/profile_items.html")
+def show_profiles(users):
+    """
+    Render ``idios/profile_item.html`` for each of ``users``, loading
+    the profiles of all cache misses in a single query.
+    """
+    return {"cards": render_profile_cards(users)}
 
 
 @register.simple_tag
@@ -7,6 +7,9 @@ class SimpleProfile(ProfileBase):
 
     name = models.CharField(max_length=100)
 
+    class Meta(ProfileBase.Meta):
+        unique_together = [("user",)]
+
 
 class SecretIdentityProfile(ProfileBase):
     super_power = models.CharField(max_length=100)
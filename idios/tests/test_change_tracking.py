@@ -0,0 +1,86 @@
+from django.db import connections
+from django.db.models.signals import post_save
+from django.test.utils import CaptureQueriesContext
+
+from django.contrib.auth.models import User
+
+from .models import SimpleProfile, SecretVillainProfile
+from .utils import SettingsTestCase
+
+
+class TestChangeTracking(SettingsTestCase):
+
+    multi_db = True
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+    }
+
+    def setUp(self):
+        self.user = User.objects.create(username="alice")
+        self.profile = SimpleProfile.objects.get(user=self.user)
+        self.saved = []
+        post_save.connect(self.record_save)
+
+    def tearDown(self):
+        post_save.disconnect(self.record_save)
+
+    def record_save(self, sender, instance=None, update_fields=None, **kwargs):
+        self.saved.append((sender, update_fields and sorted(update_fields)))
+
+    def assertUpdated(self, profile, fields, **kwargs):
+        with CaptureQueriesContext(connections["default"]) as queries:
+            profile.save(**kwargs)
+        self.assertEqual(len(queries), 1)
+        self.assertIn("UPDATE", queries[0]["sql"])
+        self.assertEqual(
+            self.saved,
+            [(type(profile), sorted(fields + ["missing_fields_mask", "missing_fields_key", "modified"]))]
+        )
+
+    def test_unchanged_profile_not_saved(self):
+        with self.assertNumQueries(0):
+            self.profile.save()
+        self.assertEqual(self.saved, [])
+
+    def test_changed_fields(self):
+        self.assertEqual(self.profile.get_changed_fields(), [])
+        self.profile.name = "Alice"
+        self.assertEqual(self.profile.get_changed_fields(), ["name"])
+        self.assertUpdated(self.profile, ["name"])
+        self.assertEqual(self.profile.get_changed_fields(), [])
+        self.assertEqual(SimpleProfile.objects.get(pk=self.profile.pk).name, "Alice")
+
+    def test_deferred_fields_not_changed(self):
+        profile = SimpleProfile.objects.only("user").get(pk=self.profile.pk)
+        self.assertEqual(profile.get_changed_fields(), [])
+        with self.assertNumQueries(0):
+            profile.save()
+
+    def test_update_fields_passed_through(self):
+        self.assertUpdated(self.profile, ["name"], update_fields=["name"])
+
+    def test_track_changes_off(self):
+        self.profile.track_changes = False
+        self.profile.save()
+        self.assertEqual(self.saved, [(SimpleProfile, None)])
+
+    def test_parent_field_of_inherited_profile(self):
+        villain = SecretVillainProfile.objects.create(
+            user=self.user, super_power="flight", fiendish_plot="world domination"
+        )
+        villain = SecretVillainProfile.objects.get(pk=villain.pk)
+        del self.saved[:]
+        with self.assertNumQueries(0):
+            villain.save()
+        villain.super_power = "invisibility"
+        villain.save()
+        self.assertEqual(
+            self.saved,
+            [(SecretVillainProfile, ["missing_fields_key", "missing_fields_mask", "modified", "super_power"])]
+        )
+        self.assertEqual(SecretVillainProfile.objects.get(pk=villain.pk).super_power, "invisibility")
+
+    def test_save_to_other_database(self):
+        self.profile.save(using="replica")
+        self.assertEqual(self.saved, [(SimpleProfile, None)])
+        self.assertTrue(SimpleProfile.objects.using("replica").filter(pk=self.profile.pk).exists())
@@ -0,0 +1,131 @@
+from django.core.urlresolvers import reverse
+
+from django.contrib.auth.models import User
+
+from ..urlbuilder import clear_url_builders
+from .models import SimpleProfile, SecretIdentityProfile
+from .utils import SettingsTestCase
+
+
+BACKENDS = [
+    "django.contrib.auth.backends.ModelBackend",
+    "idios.tests.utils.ProfileViewBackend",
+]
+
+
+class ConditionalGetTestCase(SettingsTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile, SecretIdentityProfile],
+        "AUTHENTICATION_BACKENDS": BACKENDS,
+    }
+
+    def setUp(self):
+        clear_url_builders()
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+
+    def tearDown(self):
+        clear_url_builders()
+
+    def get_etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header("Last-Modified"))
+        return response["ETag"]
+
+    def assertNotModified(self, url, etag):
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def assertModified(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class TestListConditionalGet(ConditionalGetTestCase):
+
+    def setUp(self):
+        super(TestListConditionalGet, self).setUp()
+        self.url = reverse("profile_list")
+
+    def test_not_modified(self):
+        self.assertNotModified(self.url, self.get_etag(self.url))
+
+    def test_modified_since_alone_is_not_answered(self):
+        self.get_etag(self.url)
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT")
+        self.assertEqual(response.status_code, 200)
+
+    def test_profile_edit(self):
+        etag = self.get_etag(self.url)
+        profile = SimpleProfile.objects.get(user=self.bob)
+        profile.name = "Bob"
+        profile.save()
+        self.assertModified(self.url, etag)
+
+    def test_rename(self):
+        etag = self.get_etag(self.url)
+        self.bob.username = "robert"
+        self.bob.save()
+        self.assertModified(self.url, etag)
+
+    def test_delete(self):
+        etag = self.get_etag(self.url)
+        SimpleProfile.objects.get(user=self.bob).delete()
+        self.assertModified(self.url, etag)
+
+    def test_search_has_its_own_etag(self):
+        etag = self.get_etag(self.url)
+        self.assertModified(self.url + "?search=bob", etag)
+
+
+class TestDetailConditionalGet(ConditionalGetTestCase):
+
+    def setUp(self):
+        super(TestDetailConditionalGet, self).setUp()
+        self.profile = SimpleProfile.objects.get(user=self.alice)
+        self.url = self.profile.get_absolute_url()
+
+    def test_not_modified(self):
+        etag = self.get_etag(self.url)
+        with self.assertNumQueries(1):
+            self.assertNotModified(self.url, etag)
+
+    def test_full_response_queries(self):
+        with self.assertNumQueries(2):
+            self.get_etag(self.url)
+
+    def test_profile_edit(self):
+        etag = self.get_etag(self.url)
+        self.profile.name = "Alice"
+        self.profile.save()
+        self.assertModified(self.url, etag)
+
+    def test_rename(self):
+        etag = self.get_etag(self.url)
+        self.alice.username = "alice.liddell"
+        self.alice.save()
+        self.assertModified(self.url, etag)
+
+    def test_other_profile_deleted(self):
+        secret = SecretIdentityProfile.objects.create(user=self.alice, super_power="flight")
+        etag = self.get_etag(self.url)
+        secret.delete()
+        self.assertModified(self.url, etag)
+
+    def test_other_users_profile_edit(self):
+        etag = self.get_etag(self.url)
+        profile = SimpleProfile.objects.get(user=self.bob)
+        profile.name = "Bob"
+        profile.save()
+        self.assertNotModified(self.url, etag)
+
+    def test_invisible_profile(self):
+        etag = self.get_etag(self.url)
+        self.alice.username = "hidden-alice"
+        self.alice.save()
+        response = self.client.get(
+            self.url, HTTP_IF_NONE_MATCH=etag, HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT"
+        )
+        self.assertEqual(response.status_code, 404)
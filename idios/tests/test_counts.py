@@ -0,0 +1,121 @@
+from django.core.management import call_command
+from django.test.client import RequestFactory
+from django.utils.six import StringIO
+
+from django.contrib.auth.models import AnonymousUser, User
+
+from .. import search
+from ..counts import get_profile_count, reconcile_profile_counts
+from ..models import ProfileCount, skip_profile_creation
+from ..transfer import import_profile_records
+from ..urlbuilder import clear_url_builders
+from ..views import ProfileListView
+from .models import SimpleProfile, SecretIdentityProfile, SecretVillainProfile
+from .utils import SettingsTestCase
+
+
+class CountsTestCase(SettingsTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+        "IDIOS_SEARCH_BACKEND": search.TokenSearchBackend,
+    }
+
+    def setUp(self):
+        search._search_backend = None
+        clear_url_builders()
+        self.alice = User.objects.create(username="alice")
+
+    def tearDown(self):
+        search._search_backend = None
+        clear_url_builders()
+
+
+class TestProfileCounts(CountsTestCase):
+
+    def test_not_counted_until_reconciled(self):
+        self.assertIsNone(get_profile_count(SimpleProfile))
+        self.assertEqual(reconcile_profile_counts([SimpleProfile]), {SimpleProfile: 1})
+        self.assertEqual(get_profile_count(SimpleProfile), 1)
+
+    def test_drifted_count_ignored(self):
+        ProfileCount.objects.create(profile_type="tests.SimpleProfile", count=-1)
+        self.assertIsNone(get_profile_count(SimpleProfile))
+
+    def test_create_and_delete(self):
+        reconcile_profile_counts([SimpleProfile])
+        User.objects.create(username="bob")
+        self.assertEqual(get_profile_count(SimpleProfile), 2)
+        SimpleProfile.objects.get(user=self.alice).save()
+        self.assertEqual(get_profile_count(SimpleProfile), 2)
+        SimpleProfile.objects.get(user=self.alice).delete()
+        self.assertEqual(get_profile_count(SimpleProfile), 1)
+
+    def test_inherited_profile(self):
+        reconcile_profile_counts([SecretIdentityProfile, SecretVillainProfile])
+        SecretIdentityProfile.objects.create(user=self.alice, super_power="flight")
+        villain = SecretVillainProfile.objects.create(
+            user=self.alice, super_power="invisibility", fiendish_plot="world domination"
+        )
+        # a villain is a secret identity too
+        self.assertEqual(get_profile_count(SecretIdentityProfile), 2)
+        self.assertEqual(get_profile_count(SecretVillainProfile), 1)
+        # deleting the villain deletes its parent row, which is counted
+        # by its own post_delete
+        villain.delete()
+        self.assertEqual(get_profile_count(SecretIdentityProfile), 1)
+        self.assertEqual(get_profile_count(SecretVillainProfile), 0)
+        self.assertEqual(
+            reconcile_profile_counts([SecretIdentityProfile, SecretVillainProfile]),
+            {SecretIdentityProfile: 1, SecretVillainProfile: 0}
+        )
+
+    def test_backfill(self):
+        reconcile_profile_counts([SimpleProfile])
+        with skip_profile_creation():
+            User.objects.create(username="bob")
+            User.objects.create(username="carol")
+        call_command("idios_backfill_profiles", "simpleprofile", stdout=StringIO())
+        self.assertEqual(get_profile_count(SimpleProfile), 3)
+
+    def test_import(self):
+        reconcile_profile_counts([SimpleProfile])
+        with skip_profile_creation():
+            User.objects.create(username="bob")
+        counts = import_profile_records(
+            {"simpleprofile": SimpleProfile},
+            [
+                {"profile_slug": "simpleprofile", "user": "alice", "name": "Alice"},
+                {"profile_slug": "simpleprofile", "user": "bob", "name": "Bob"},
+            ]
+        )
+        self.assertEqual(counts, (1, 1, 0))
+        self.assertEqual(get_profile_count(SimpleProfile), 2)
+
+
+class TestListCount(CountsTestCase):
+
+    def setUp(self):
+        super(TestListCount, self).setUp()
+        User.objects.create(username="bob")
+        reconcile_profile_counts([SimpleProfile])
+        # a stored count differing from the rows shows which one is used
+        ProfileCount.objects.update(count=10)
+
+    def get_count(self, **params):
+        request = RequestFactory().get("/profiles/", params)
+        request.user = AnonymousUser()
+        response = ProfileListView.as_view(paginate_by=1)(request)
+        return response.context_data["paginator"].count
+
+    def test_stored_count(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_profile_count(SimpleProfile), 10)
+        self.assertEqual(self.get_count(), 10)
+
+    def test_search_counted(self):
+        self.assertEqual(self.get_count(search="bob"), 1)
+
+    def test_not_reconciled(self):
+        ProfileCount.objects.all().delete()
+        self.assertEqual(self.get_count(), 2)
@@ -0,0 +1,52 @@
+from django.core.urlresolvers import reverse
+
+from django.contrib.auth.models import User
+
+from ..urlbuilder import clear_url_builders
+from .models import SimpleProfile, SecretIdentityProfile
+from .utils import SettingsTestCase
+
+
+class ListViewTestCase(SettingsTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile, SecretIdentityProfile],
+    }
+
+    def setUp(self):
+        clear_url_builders()
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+
+    def tearDown(self):
+        clear_url_builders()
+
+
+class TestListFields(ListViewTestCase):
+
+    def test_every_field_loaded_by_default(self):
+        response = self.client.get(reverse("profile_list"))
+        profiles = list(response.context["profiles"])
+        self.assertEqual(len(profiles), 2)
+        self.assertFalse(any(profile._deferred for profile in profiles))
+
+    def test_item_projection(self):
+        SimpleProfile.list_fields = "__item__"
+        try:
+            response = self.client.get(reverse("profile_list"))
+        finally:
+            SimpleProfile.list_fields = "__all__"
+        profile = list(response.context["profiles"])[0]
+        self.assertTrue(profile._deferred)
+        self.assertEqual(profile.profile_slug, "simpleprofile")
+        self.assertEqual(
+            profile.get_absolute_url(),
+            "/profiles/simpleprofile/profile/{0}/".format(profile.pk)
+        )
+
+    def test_profile_slug_of_deferred_rows(self):
+        profile = SimpleProfile.objects.only("user").get(user=self.alice)
+        self.assertEqual(profile.profile_slug, "simpleprofile")
+        secret = SecretIdentityProfile.objects.create(user=self.alice, super_power="flight")
+        secret = SecretIdentityProfile.objects.only("user").get(pk=secret.pk)
+        self.assertEqual(secret.profile_slug, "secret")
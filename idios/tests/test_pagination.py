@@ -0,0 +1,138 @@
+import datetime
+
+from django.http import Http404
+from django.test.client import RequestFactory
+
+from django.contrib.auth.models import AnonymousUser, User
+
+from ..pagination import CursorPaginator, InvalidCursor, encode_cursor
+from ..urlbuilder import clear_url_builders
+from ..views import ProfileListView
+from .models import SimpleProfile
+from .utils import SettingsTestCase
+
+
+class PaginationTestCase(SettingsTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+    }
+
+    def setUp(self):
+        clear_url_builders()
+        joined = datetime.datetime(2013, 1, 1)
+        # three users share a date_joined, so their order is decided by pk
+        for username, days in [("erin", 0), ("dave", 1), ("carol", 1), ("bob", 1), ("alice", 2)]:
+            User.objects.create(username=username, date_joined=joined + datetime.timedelta(days=days))
+
+    def tearDown(self):
+        clear_url_builders()
+
+
+class TestCursorPaginator(PaginationTestCase):
+
+    def setUp(self):
+        super(TestCursorPaginator, self).setUp()
+        self.paginator = CursorPaginator(
+            SimpleProfile.objects.select_related("user"), 2, ("-user__date_joined", "-pk")
+        )
+        profiles = SimpleProfile.objects.select_related("user")
+        keys = sorted(((p.user.date_joined, p.pk, p.user.username) for p in profiles), reverse=True)
+        self.expected = [username for joined, pk, username in keys]
+
+    def usernames(self, object_list):
+        return [profile.user.username for profile in object_list]
+
+    def test_ties_broken_by_pk(self):
+        self.assertEqual(self.expected, ["alice", "bob", "carol", "dave", "erin"])
+
+    def test_forwards(self):
+        object_list, previous_cursor, next_cursor = self.paginator.page()
+        self.assertEqual(self.usernames(object_list), ["alice", "bob"])
+        self.assertIsNone(previous_cursor)
+        object_list, previous_cursor, next_cursor = self.paginator.page(next_cursor)
+        # the page boundary falls between rows with the same date_joined
+        self.assertEqual(self.usernames(object_list), ["carol", "dave"])
+        self.assertIsNotNone(previous_cursor)
+        object_list, previous_cursor, next_cursor = self.paginator.page(next_cursor)
+        self.assertEqual(self.usernames(object_list), ["erin"])
+        self.assertIsNotNone(previous_cursor)
+        self.assertIsNone(next_cursor)
+
+    def test_backwards(self):
+        cursor = None
+        for i in range(3):
+            object_list, previous_cursor, cursor = self.paginator.page(cursor)
+        self.assertEqual(self.usernames(object_list), ["erin"])
+        object_list, previous_cursor, next_cursor = self.paginator.page(previous_cursor)
+        self.assertEqual(self.usernames(object_list), ["carol", "dave"])
+        self.assertIsNotNone(next_cursor)
+        object_list, previous_cursor, next_cursor = self.paginator.page(previous_cursor)
+        self.assertEqual(self.usernames(object_list), ["alice", "bob"])
+        self.assertIsNone(previous_cursor)
+        self.assertIsNotNone(next_cursor)
+        self.assertEqual(self.usernames(self.paginator.page(next_cursor)[0]), ["carol", "dave"])
+
+    def test_single_page(self):
+        paginator = CursorPaginator(
+            SimpleProfile.objects.select_related("user"), 10, ("-user__date_joined", "-pk")
+        )
+        object_list, previous_cursor, next_cursor = paginator.page()
+        self.assertEqual(self.usernames(object_list), self.expected)
+        self.assertIsNone(previous_cursor)
+        self.assertIsNone(next_cursor)
+
+    def test_ascending(self):
+        paginator = CursorPaginator(
+            SimpleProfile.objects.select_related("user"), 3, ("user__username", "pk")
+        )
+        object_list, previous_cursor, next_cursor = paginator.page()
+        self.assertEqual(self.usernames(object_list), ["alice", "bob", "carol"])
+        self.assertEqual(self.usernames(paginator.page(next_cursor)[0]), ["dave", "erin"])
+
+    def test_invalid_cursors(self):
+        pk = SimpleProfile.objects.all()[0].pk
+        for cursor in [
+            "!!!",
+            "bm90IGpzb24",  # "not json"
+            encode_cursor("sideways", "2013-01-01T00:00:00", pk),
+            encode_cursor("next", "not a date", pk),
+            encode_cursor("next", "2013-01-01T00:00:00", "not a pk"),
+        ]:
+            self.assertRaises(InvalidCursor, self.paginator.page, cursor)
+
+    def test_iter_values(self):
+        usernames = [row["user__username"] for row in self.paginator.iter_values("user__username")]
+        self.assertEqual(usernames, self.expected)
+
+
+class TestCursorPaginatedView(PaginationTestCase):
+
+    def get(self, **params):
+        view = ProfileListView.as_view(cursor_pagination=True, paginate_by=2)
+        request = RequestFactory().get("/profiles/", params)
+        request.user = AnonymousUser()
+        return view(request)
+
+    def usernames(self, response):
+        return [profile.user.username for profile in response.context_data["profiles"]]
+
+    def test_pages(self):
+        response = self.get()
+        self.assertEqual(self.usernames(response), ["alice", "bob"])
+        self.assertTrue(response.context_data["is_paginated"])
+        self.assertIsNone(response.context_data["previous_cursor"])
+        response = self.get(cursor=response.context_data["next_cursor"])
+        self.assertEqual(self.usernames(response), ["carol", "dave"])
+
+    def test_order_by_name(self):
+        response = self.get(order="name")
+        self.assertEqual(self.usernames(response), ["alice", "bob"])
+        self.assertIn("order=name", response.context_data["next_cursor_query"])
+        response = self.get(order="name", cursor=response.context_data["next_cursor"])
+        self.assertEqual(self.usernames(response), ["carol", "dave"])
+
+    def test_invalid_cursor_not_found(self):
+        self.assertRaises(Http404, self.get, cursor="!!!")
+        tampered = encode_cursor("next", "not a date", 1)
+        self.assertRaises(Http404, self.get, cursor=tampered)
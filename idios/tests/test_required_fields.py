@@ -0,0 +1,63 @@
+from django.contrib.auth.models import User
+
+from .. import utils
+from .models import SimpleProfile
+from .utils import SettingsTestCase
+
+
+class TestMissingFields(SettingsTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+    }
+
+    def setUp(self):
+        utils._required_fields_cache.clear()
+        self.profile = SimpleProfile.objects.get(user=User.objects.create(username="alice"))
+
+    def tearDown(self):
+        self.set_required_fields(None)
+
+    def set_required_fields(self, fields):
+        if fields is None:
+            del SimpleProfile.idios_required_fields
+        else:
+            SimpleProfile.idios_required_fields = lambda self: fields
+        utils._required_fields_cache.clear()
+
+    def reload(self):
+        return SimpleProfile.objects.get(pk=self.profile.pk)
+
+    def test_mask_stored_on_save(self):
+        self.set_required_fields(["name"])
+        self.profile.save(update_fields=["name"])
+        profile = self.reload()
+        self.assertEqual(profile.missing_fields_mask, 1)
+        self.assertEqual(profile.missing_fields_key, utils.get_required_fields_key(profile))
+        self.assertEqual(utils.get_missing_fields(profile), ["name"])
+        self.assertEqual(list(SimpleProfile.incomplete_profiles()), [profile])
+
+    def test_complete_profile(self):
+        self.set_required_fields(["name"])
+        self.profile.name = "Alice"
+        self.profile.save()
+        self.assertTrue(self.reload().is_complete)
+        self.assertEqual(list(SimpleProfile.incomplete_profiles()), [])
+
+    def test_mask_for_other_required_fields_not_trusted(self):
+        self.profile.save(update_fields=["name"])
+        self.assertEqual(self.reload().missing_fields_mask, 0)
+        self.set_required_fields(["name"])
+        profile = self.reload()
+        self.assertEqual(utils.get_missing_fields(profile), ["name"])
+        self.assertFalse(profile.is_complete)
+        self.assertEqual(list(SimpleProfile.incomplete_profiles()), [profile])
+        profile.name = "Alice"
+        profile.save()
+        self.assertEqual(list(SimpleProfile.incomplete_profiles()), [])
+
+    def test_key_depends_on_field_order(self):
+        self.set_required_fields(["name", "user"])
+        key = utils.get_required_fields_key(self.profile)
+        self.set_required_fields(["user", "name"])
+        self.assertNotEqual(utils.get_required_fields_key(self.profile), key)
@@ -0,0 +1,116 @@
+from django.core.management import call_command
+from django.core.signals import request_finished
+from django.db import router
+from django.test.client import RequestFactory
+from django.utils.six import StringIO
+
+from django.contrib.auth.models import User
+
+from .. import search
+from ..models import ProfileCount, ProfileSearchToken
+from ..routers import IdiosRouter, is_pinned, pin_primary, set_pinned
+from ..transfer import import_profile_records
+from ..views import ProfileUpdateView
+from .models import SimpleProfile
+from .utils import SettingsTestCase
+
+
+class TestIdiosRouter(SettingsTestCase):
+    """
+    Routing between the "default" database and "replica", a separate
+    database that nothing is replicated to, i.e. a replica lagging
+    forever.
+    """
+
+    multi_db = True
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+        "IDIOS_SEARCH_BACKEND": search.TokenSearchBackend,
+        "IDIOS_READ_DATABASE": "replica",
+        "IDIOS_WRITE_DATABASE": "default",
+    }
+
+    def setUp(self):
+        search._search_backend = None
+        self.old_routers = router.routers
+        router.routers = [IdiosRouter()]
+
+    def tearDown(self):
+        router.routers = self.old_routers
+        search._search_backend = None
+        set_pinned(False)
+
+    def test_profile_reads_go_to_replica(self):
+        self.assertEqual(router.db_for_read(SimpleProfile), "replica")
+        self.assertEqual(router.db_for_write(SimpleProfile), "default")
+        User.objects.create(username="alice")
+        self.assertFalse(SimpleProfile.objects.filter(user__username="alice").exists())
+        self.assertTrue(SimpleProfile.objects.using("default").filter(user__username="alice").exists())
+
+    def test_other_models_not_routed(self):
+        self.assertEqual(router.db_for_read(User), "default")
+
+    def test_bookkeeping_reads_go_to_primary(self):
+        self.assertEqual(router.db_for_read(ProfileSearchToken), "default")
+        self.assertEqual(router.db_for_read(ProfileCount), "default")
+
+    def test_resaving_user_does_not_duplicate_tokens(self):
+        user = User.objects.create(username="alice")
+        user.save()
+        self.assertEqual(ProfileSearchToken.objects.filter(user=user).count(), 1)
+
+    def test_pinned_reads_go_to_primary(self):
+        User.objects.create(username="alice")
+        pin_primary(RequestFactory().get("/"))
+        self.assertEqual(router.db_for_read(SimpleProfile), "default")
+        self.assertTrue(SimpleProfile.objects.filter(user__username="alice").exists())
+
+    def test_pin_cleared_when_request_finishes(self):
+        pin_primary(RequestFactory().get("/"))
+        request_finished.send(sender=self.__class__)
+        self.assertFalse(is_pinned())
+        self.assertEqual(router.db_for_read(SimpleProfile), "replica")
+
+    def test_routing_disabled_without_read_database(self):
+        from ..conf import settings
+        settings.IDIOS_READ_DATABASE = None
+        try:
+            self.assertEqual(router.db_for_read(SimpleProfile), "default")
+        finally:
+            settings.IDIOS_READ_DATABASE = "replica"
+
+    def test_edit_view_reads_primary(self):
+        user = User.objects.create(username="alice")
+        request = RequestFactory().get("/profiles/edit/")
+        request.user = user
+        response = ProfileUpdateView.as_view()(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context_data["profile"].user_id, user.pk)
+        # reading for the form does not pin later requests
+        self.assertFalse(getattr(request, "_idios_pin_primary", False))
+
+    def test_edit_view_pins_after_save(self):
+        user = User.objects.create(username="alice")
+        request = RequestFactory().post("/profiles/edit/", {"name": "Alice"})
+        request.user = user
+        request._dont_enforce_csrf_checks = True
+        response = ProfileUpdateView.as_view()(request)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(request._idios_pin_primary)
+        self.assertEqual(SimpleProfile.objects.using("default").get(user=user).name, "Alice")
+
+    def test_import_updates_profiles_on_primary(self):
+        User.objects.create(username="alice")
+        counts = import_profile_records(
+            {"simpleprofile": SimpleProfile},
+            [{"profile_slug": "simpleprofile", "user": "alice", "name": "Alice"}]
+        )
+        self.assertEqual(counts, (0, 1, 0))
+        self.assertEqual(SimpleProfile.objects.using("default").get().name, "Alice")
+
+    def test_backfill_sees_profiles_on_primary(self):
+        User.objects.create(username="alice")
+        stdout = StringIO()
+        call_command("idios_backfill_profiles", "simpleprofile", stdout=stdout)
+        self.assertIn("created 0 profiles", stdout.getvalue())
+        self.assertEqual(SimpleProfile.objects.using("default").count(), 1)
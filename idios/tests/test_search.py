@@ -0,0 +1,135 @@
+import sqlite3
+import unittest
+
+from django.core.management import call_command
+from django.utils.six import StringIO
+
+from django.contrib.auth.models import User
+
+from .. import search
+from ..models import ProfileSearchToken, skip_profile_creation
+from .models import SimpleProfile
+from .utils import SettingsTestCase
+
+
+def has_fts5():
+    connection = sqlite3.connect(":memory:")
+    try:
+        connection.execute("CREATE VIRTUAL TABLE fts5_probe USING fts5(body)")
+    except sqlite3.OperationalError:
+        return False
+    finally:
+        connection.close()
+    return True
+
+
+class SearchTestCase(SettingsTestCase):
+
+    def setUp(self):
+        # each test gets a fresh backend instance (and FTS table check)
+        search._search_backend = None
+        self.alice = User.objects.create(username="alice.liddell")
+        self.bob = User.objects.create(username="bob")
+
+    def tearDown(self):
+        search._search_backend = None
+
+    def search(self, terms):
+        profiles = search.get_search_backend().filter(SimpleProfile.objects.all(), terms)
+        return sorted(profile.user.username for profile in profiles)
+
+
+class TestTokenSearchBackend(SearchTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+        "IDIOS_SEARCH_BACKEND": search.TokenSearchBackend,
+    }
+
+    def test_tokens_created_with_user(self):
+        self.assertEqual(
+            sorted(ProfileSearchToken.objects.filter(user=self.alice).values_list("token", flat=True)),
+            ["alice", "alice.liddell", "liddell"]
+        )
+
+    def test_prefix_match(self):
+        self.assertEqual(self.search("lid"), ["alice.liddell"])
+        self.assertEqual(self.search("B"), ["bob"])
+        self.assertEqual(self.search("idd"), [])
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.search("alice lidd"), ["alice.liddell"])
+        self.assertEqual(self.search("alice bob"), [])
+
+    def test_rename_updates_tokens(self):
+        self.alice.username = "alice.hargreaves"
+        self.alice.save()
+        self.assertEqual(self.search("liddell"), [])
+        self.assertEqual(self.search("harg"), ["alice.hargreaves"])
+
+    def test_repeated_save_does_not_duplicate_tokens(self):
+        self.alice.save()
+        self.alice.save()
+        self.assertEqual(ProfileSearchToken.objects.filter(user=self.alice).count(), 3)
+
+    def test_tokens_removed_with_user(self):
+        self.alice.delete()
+        self.assertFalse(ProfileSearchToken.objects.filter(token="alice").exists())
+
+    def test_rebuild(self):
+        ProfileSearchToken.objects.all().delete()
+        search.get_search_backend().rebuild()
+        self.assertEqual(self.search("lidd"), ["alice.liddell"])
+
+
+@unittest.skipUnless(has_fts5(), "SQLite is built without FTS5")
+class TestSQLiteFTSSearchBackend(SearchTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+        "IDIOS_SEARCH_BACKEND": search.SQLiteFTSSearchBackend,
+    }
+
+    def test_username_prefix_match(self):
+        self.assertEqual(self.search("lidd"), ["alice.liddell"])
+        self.assertEqual(self.search("alice lidd"), ["alice.liddell"])
+        self.assertEqual(self.search("alice bob"), [])
+
+    def test_profile_fields_indexed_on_save(self):
+        profile = SimpleProfile.objects.get(user=self.bob)
+        profile.name = "Robert Builder"
+        profile.save()
+        self.assertEqual(self.search("build"), ["bob"])
+        profile.name = "Robert Baker"
+        profile.save()
+        self.assertEqual(self.search("build"), [])
+        self.assertEqual(self.search("bake"), ["bob"])
+
+    def test_rename_updates_index(self):
+        self.alice.username = "alice.hargreaves"
+        self.alice.save()
+        self.assertEqual(self.search("lidd"), [])
+        self.assertEqual(self.search("harg"), ["alice.hargreaves"])
+
+    def test_profile_removed_on_delete(self):
+        SimpleProfile.objects.get(user=self.alice).delete()
+        self.assertEqual(self.search("alice"), [])
+
+    def test_filter_is_a_single_query(self):
+        profiles = search.get_search_backend().filter(SimpleProfile.objects.all(), "a")
+        with self.assertNumQueries(1):
+            self.assertEqual([p.user_id for p in profiles], [self.alice.pk])
+
+    def test_rebuild(self):
+        backend = search.get_search_backend()
+        backend.cursor(SimpleProfile).execute("DELETE FROM {0}".format(backend.table))
+        self.assertEqual(self.search("alice"), [])
+        backend.rebuild()
+        self.assertEqual(self.search("alice"), ["alice.liddell"])
+
+    def test_backfilled_profiles_indexed(self):
+        with skip_profile_creation():
+            User.objects.create(username="carol")
+        call_command("idios_backfill_profiles", "simpleprofile", stdout=StringIO())
+        self.assertEqual(self.search("car"), ["carol"])
+        self.assertEqual(self.search("alice"), ["alice.liddell"])
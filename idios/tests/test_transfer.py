@@ -0,0 +1,42 @@
+from django.contrib.auth.models import User
+
+from ..transfer import get_transfer_fields, import_profile_records, iter_profile_records
+from .models import SimpleProfile, SecretVillainProfile
+from .utils import SettingsTestCase
+
+
+class TestTransfer(SettingsTestCase):
+
+    setting_overrides = {
+        "IDIOS_PROFILE_MODULES": [SimpleProfile],
+    }
+
+    def setUp(self):
+        self.alice = User.objects.create(username="alice")
+
+    def test_transfer_fields(self):
+        self.assertEqual([f.name for f in get_transfer_fields(SimpleProfile)], ["name"])
+        self.assertEqual(
+            [f.name for f in get_transfer_fields(SecretVillainProfile)],
+            ["super_power", "fiendish_plot"]
+        )
+
+    def test_export(self):
+        SimpleProfile.objects.filter(user=self.alice).update(name="Alice")
+        self.assertEqual(
+            list(iter_profile_records(SimpleProfile)),
+            [{"profile_slug": "simpleprofile", "user": "alice", "name": "Alice"}]
+        )
+
+    def test_import_ignores_internal_fields(self):
+        import_profile_records(
+            {"simpleprofile": SimpleProfile},
+            [{
+                "profile_slug": "simpleprofile", "user": "alice", "name": "Alice",
+                "missing_fields_mask": 7, "modified": "2000-01-01T00:00:00",
+            }]
+        )
+        profile = SimpleProfile.objects.get(user=self.alice)
+        self.assertEqual(profile.name, "Alice")
+        self.assertEqual(profile.missing_fields_mask, 0)
+        self.assertNotEqual(profile.modified.year, 2000)
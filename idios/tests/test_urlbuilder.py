@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+
+from ..urlbuilder import clear_url_builders, get_url_builder, profile_urls
+from .models import SimpleProfile, SecretIdentityProfile
+from .utils import SettingsTestCase
+
+
+class URLBuilderTestCase(SettingsTestCase):
+
+    def setUp(self):
+        # builders are only dropped automatically on setting_changed
+        clear_url_builders()
+        self.alice = User.objects.create(username="alice")
+        self.bob = User.objects.create(username="bob")
+
+    def tearDown(self):
+        clear_url_builders()
+
+
+class TestURLBuilderSingleProfile(URLBuilderTestCase):
+
+    setting_overrides = {"IDIOS_PROFILE_MODULES": [SimpleProfile]}
+
+    def test_get_absolute_url(self):
+        profile = SimpleProfile.objects.get(user=self.alice)
+        self.assertEqual(profile.get_absolute_url(), "/profiles/profile/alice/")
+
+    def test_deferred_profile(self):
+        profile = SimpleProfile.objects.only("user").get(user=self.alice)
+        self.assertEqual(profile.get_absolute_url(), "/profiles/profile/alice/")
+        self.assertIs(get_url_builder(type(profile)), get_url_builder(SimpleProfile))
+
+    def test_profile_urls_loads_usernames_in_one_query(self):
+        profiles = list(SimpleProfile.objects.order_by("user__username"))
+        with self.assertNumQueries(1):
+            urls = profile_urls(profiles)
+        self.assertEqual(urls, ["/profiles/profile/alice/", "/profiles/profile/bob/"])
+
+    def test_profile_urls_with_joined_users(self):
+        profiles = list(SimpleProfile.objects.select_related("user").order_by("user__username"))
+        with self.assertNumQueries(0):
+            urls = profile_urls(profiles)
+        self.assertEqual(urls, ["/profiles/profile/alice/", "/profiles/profile/bob/"])
+
+    def test_username_is_quoted(self):
+        self.alice.username = "alice.l-1"
+        self.alice.save()
+        profile = SimpleProfile.objects.get(user=self.alice)
+        self.assertEqual(profile.get_absolute_url(), "/profiles/profile/alice.l-1/")
+
+
+class TestURLBuilderMultiProfiles(URLBuilderTestCase):
+
+    setting_overrides = {"IDIOS_PROFILE_MODULES": [SimpleProfile, SecretIdentityProfile]}
+
+    def test_get_absolute_url(self):
+        profile = SimpleProfile.objects.get(user=self.alice)
+        secret = SecretIdentityProfile.objects.create(user=self.alice, super_power="flight")
+        self.assertEqual(
+            profile.get_absolute_url(), "/profiles/simpleprofile/profile/{0}/".format(profile.pk)
+        )
+        self.assertEqual(secret.get_absolute_url(), "/profiles/secret/profile/{0}/".format(secret.pk))
+
+    def test_deferred_profiles(self):
+        profile = SimpleProfile.objects.only("user").get(user=self.alice)
+        secret = SecretIdentityProfile.objects.create(user=self.alice, super_power="flight")
+        secret = SecretIdentityProfile.objects.only("user").get(pk=secret.pk)
+        self.assertEqual(
+            profile.get_absolute_url(), "/profiles/simpleprofile/profile/{0}/".format(profile.pk)
+        )
+        self.assertEqual(secret.get_absolute_url(), "/profiles/secret/profile/{0}/".format(secret.pk))
+        self.assertIs(get_url_builder(type(secret)), get_url_builder(SecretIdentityProfile))
+
+    def test_profile_urls_needs_no_query(self):
+        profiles = list(SimpleProfile.objects.only("user").order_by("user__username"))
+        with self.assertNumQueries(0):
+            urls = profile_urls(profiles)
+        self.assertEqual(urls, [
+            "/profiles/simpleprofile/profile/{0}/".format(profile.pk) for profile in profiles
+        ])
@@ -3,6 +3,22 @@ from django.test import TestCase
 from ..conf import settings
 
 
+class ProfileViewBackend(object):
+    """
+    Grants ``can_view`` on all profiles except those of users whose
+    username starts with "hidden".
+    """
+
+    def authenticate(self, **credentials):
+        return None
+
+    def get_user(self, user_id):
+        return None
+
+    def has_perm(self, user_obj, perm, obj=None):
+        return perm == "can_view" and obj is not None and not obj.user.username.startswith("hidden")
+
+
 # this would make a lovely context manager, but... 2.4 :(
 class SettingsTestCase(TestCase):
     setting_overrides = {}
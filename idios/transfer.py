@@ -0,0 +1,211 @@
+"""
+Streaming export and import of profiles, used by the
+``idios_export_profiles`` and ``idios_import_profiles`` management
+commands.
+
+Each record holds the profile type (``profile_slug``), the username of
+the owning user and the profile's own field values, as derived from the
+model by ``get_transfer_fields``. Exports read profiles in primary key
+ordered chunks so memory use stays constant; imports write in chunks,
+one transaction per chunk. New profiles are inserted with one query per
+chunk and profile type, but existing profiles are updated with one
+``save()`` each, which only writes them if a field changed.
+
+"""
+from __future__ import absolute_import
+
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import router, transaction
+from django.utils import six
+
+from django.contrib.auth.models import User
+
+from .cache import invalidate_profile_card
+from .counts import adjust_profile_count
+from .utils import update_missing_fields_mask
+
+
+FORMATS = ["jsonl", "csv"]
+
+
+def get_transfer_fields(profile_model):
+    """
+    Return the concrete fields of ``profile_model`` that are exported,
+    i.e. all of them except primary keys (including multi-table
+    inheritance parent links), ``user`` and the fields that are not
+    editable, such as ``missing_fields_mask`` and ``modified`` which
+    saving the profile maintains.
+    """
+    return [
+        field for field in profile_model._meta.concrete_fields
+        if not field.primary_key and field.editable and field.name != "user"
+    ]
+
+
+def iter_profile_records(profile_model, chunk_size=1000):
+    """
+    Yield one dict per profile of ``profile_model``, reading the table
+    in chunks of ``chunk_size`` rows by primary key.
+    """
+    fields = get_transfer_fields(profile_model)
+    names = ["pk", "user__username"] + [field.attname for field in fields]
+    rows = profile_model.objects.order_by("pk").values_list(*names)
+    last_pk = None
+    while True:
+        chunk = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            break
+        for row in chunk:
+            record = {"profile_slug": profile_model.profile_slug, "user": row[1]}
+            for field, value in zip(fields, row[2:]):
+                record[field.attname] = value
+            yield record
+        last_pk = chunk[-1][0]
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if hasattr(value, "isoformat"):
+        value = value.isoformat()
+    value = six.text_type(value)
+    if six.PY2:
+        value = value.encode("utf-8")
+    return value
+
+
+def write_jsonl(stream, records):
+    count = 0
+    for record in records:
+        stream.write(json.dumps(record, cls=DjangoJSONEncoder) + "\n")
+        count += 1
+    return count
+
+
+def write_csv(stream, profile_model, records):
+    header = ["profile_slug", "user"] + [f.attname for f in get_transfer_fields(profile_model)]
+    writer = csv.writer(stream)
+    writer.writerow(header)
+    count = 0
+    for record in records:
+        writer.writerow([_csv_value(record.get(name)) for name in header])
+        count += 1
+    return count
+
+
+def read_jsonl(stream):
+    for line in stream:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(stream):
+    for row in csv.DictReader(stream):
+        if six.PY2:
+            row = dict((k, v.decode("utf-8")) for k, v in row.items())
+        yield row
+
+
+def _to_python(field, value):
+    if value == "" and field.null and not field.empty_strings_allowed:
+        return None
+    return field.to_python(value)
+
+
+def _group_records(registry, chunk):
+    """
+    Return the records of ``chunk`` that can be imported as
+    ``{profile model: [(user id, record), ...]}`` and the number of
+    records skipped for an unknown profile type or user.
+    """
+    usernames = set(record.get("user") for record in chunk)
+    user_ids = dict(
+        User.objects.filter(username__in=usernames).values_list("username", "pk")
+    )
+    by_model = {}
+    skipped = 0
+    for record in chunk:
+        model = registry.get(record.get("profile_slug"))
+        user_id = user_ids.get(record.get("user"))
+        if model is None or user_id is None:
+            skipped += 1
+            continue
+        by_model.setdefault(model, []).append((user_id, record))
+    return by_model, skipped
+
+
+def _import_model_records(model, records):
+    """
+    Create or update the profiles of ``model`` from ``(user id,
+    record)`` pairs. Return ``(created, updated)`` counts.
+    """
+    fields = get_transfer_fields(model)
+    existing = dict(
+        (profile.user_id, profile)
+        for profile in model.objects.using(router.db_for_write(model)).filter(
+            user__in=[user_id for user_id, record in records]
+        )
+    )
+    new = []
+    updated = 0
+    for user_id, record in records:
+        profile = existing.get(user_id)
+        if profile is None:
+            # later records for the same user update this instance
+            profile = existing[user_id] = model(user_id=user_id)
+            new.append(profile)
+        for field in fields:
+            if field.attname in record:
+                setattr(profile, field.attname, _to_python(field, record[field.attname]))
+        if profile.pk is not None:
+            profile.save()
+            updated += 1
+    if model._meta.parents:
+        # bulk_create does not support multi-table inheritance
+        for profile in new:
+            profile.save()
+    else:
+        # bulk_create bypasses save(), which computes the mask
+        for profile in new:
+            update_missing_fields_mask(profile)
+        model.objects.bulk_create(new)
+        adjust_profile_count(model, len(new))
+        for profile in new:
+            invalidate_profile_card(model.profile_slug, profile.user_id)
+    return len(new), updated
+
+
+def _import_chunk(registry, chunk):
+    by_model, skipped = _group_records(registry, chunk)
+    created = updated = 0
+    with transaction.atomic():
+        for model, records in by_model.items():
+            model_created, model_updated = _import_model_records(model, records)
+            created += model_created
+            updated += model_updated
+    return created, updated, skipped
+
+
+def import_profile_records(registry, records, chunk_size=1000):
+    """
+    Create or update profiles from ``records``, a chunk of
+    ``chunk_size`` records at a time, each chunk in its own
+    transaction. ``registry`` maps profile slugs to the profile models
+    to import; records of other types, for unknown users or without
+    a user are skipped. Return ``(created, updated, skipped)`` counts.
+    """
+    totals = [0, 0, 0]
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            totals = [a + b for a, b in zip(totals, _import_chunk(registry, chunk))]
+            chunk = []
+    if chunk:
+        totals = [a + b for a, b in zip(totals, _import_chunk(registry, chunk))]
+    return tuple(totals)
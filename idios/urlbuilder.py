@@ -0,0 +1,97 @@
+"""
+Precompiled ``profile_detail`` URLs.
+
+Rather than calling ``reverse()`` for every profile rendered, the URL
+pattern is reversed once per profile type with a placeholder value and
+split around it, so building a URL is string concatenation. Builders
+are cached per URLconf and script prefix and dropped when the URLconf
+or idios settings change (``clear_url_builders``).
+
+"""
+from django.core.urlresolvers import get_script_prefix, get_urlconf, reverse
+from django.test.signals import setting_changed
+from django.utils.encoding import force_text, iri_to_uri
+
+from .utils import get_real_model
+
+
+# placeholders matching the profile_detail URL patterns
+PK_PLACEHOLDER = "9090909090909"
+USERNAME_PLACEHOLDER = "idios-username-placeholder"
+
+# {(urlconf, script prefix, profile model): ProfileURLBuilder}
+_url_builders = {}
+
+
+class ProfileURLBuilder(object):
+
+    def __init__(self, profile_model):
+        from .conf import settings
+        if len(settings.IDIOS_PROFILE_MODULES) > 1:
+            self.attr = "pk"
+            kwargs = {"profile_slug": profile_model.profile_slug, "pk": PK_PLACEHOLDER}
+            placeholder = PK_PLACEHOLDER
+        elif settings.IDIOS_USE_USERNAME:
+            self.attr = "username"
+            kwargs = {"username": USERNAME_PLACEHOLDER}
+            placeholder = USERNAME_PLACEHOLDER
+        else:
+            self.attr = "pk"
+            kwargs = {"pk": PK_PLACEHOLDER}
+            placeholder = PK_PLACEHOLDER
+        self.prefix, _, self.suffix = reverse("profile_detail", kwargs=kwargs).rpartition(placeholder)
+
+    def build(self, value):
+        return self.prefix + iri_to_uri(force_text(value)) + self.suffix
+
+    def __call__(self, profile):
+        if self.attr == "username":
+            return self.build(profile.user.username)
+        return self.build(profile.pk)
+
+
+def get_url_builder(profile_model):
+    # rows loaded with only()/defer() share their model's builder
+    profile_model = get_real_model(profile_model)
+    key = (get_urlconf(), get_script_prefix(), profile_model)
+    try:
+        return _url_builders[key]
+    except KeyError:
+        builder = _url_builders[key] = ProfileURLBuilder(profile_model)
+        return builder
+
+
+def profile_urls(profiles):
+    """
+    Return the detail URLs of ``profiles``, in order, loading the
+    usernames of all profiles without a cached user in one query when
+    URLs are built from usernames.
+    """
+    from django.contrib.auth.models import User
+    profiles = list(profiles)
+    builders = [get_url_builder(type(profile)) for profile in profiles]
+    missing = set()
+    for profile, builder in zip(profiles, builders):
+        cache_name = profile._meta.get_field("user").get_cache_name()
+        if builder.attr == "username" and not hasattr(profile, cache_name):
+            missing.add(profile.user_id)
+    usernames = {}
+    if missing:
+        usernames = dict(User.objects.filter(pk__in=missing).values_list("pk", "username"))
+    urls = []
+    for profile, builder in zip(profiles, builders):
+        if builder.attr == "username" and profile.user_id in usernames:
+            urls.append(builder.build(usernames[profile.user_id]))
+        else:
+            urls.append(builder(profile))
+    return urls
+
+
+def clear_url_builders(**kwargs):
+    _url_builders.clear()
+
+
+def clear_url_builders_on_setting_change(setting, **kwargs):
+    if setting == "ROOT_URLCONF" or setting.startswith("IDIOS_"):
+        clear_url_builders()
+setting_changed.connect(clear_url_builders_on_setting_change)
@@ -1,7 +1,9 @@
 from django.conf.urls import patterns, url
 
 from .conf import settings
-from .views import ProfileListView, ProfileDetailView, ProfileUpdateView, ProfileCreateView
+from .views import (
+    ProfileListView, ProfileListJSONView, ProfileDetailView, ProfileUpdateView, ProfileCreateView
+)
 
 
 if settings.IDIOS_USE_USERNAME:
@@ -14,6 +16,9 @@ urlpatterns = patterns(
 
     url(r"^$", ProfileListView.as_view(), name="profile_list"),
     url(r"^all/$", ProfileListView.as_view(all_profiles=True), name="profile_list_all"),
+    url(r"^json/$", ProfileListJSONView.as_view(), name="profile_list_json"),
+    url(r"^all/json/$", ProfileListJSONView.as_view(all_profiles=True), name="profile_list_all_json"),
+    url(r"^(?P<profile_slug>[\w\._-]+)/json/$", ProfileListJSONView.as_view(), name="profile_list_json"),
 
     url(r"^edit/$", ProfileUpdateView.as_view(), name="profile_edit"),
     url(r"^(?P<profile_slug>[\w\._-]+)/edit/$", ProfileUpdateView.as_view(), name="profile_edit"),
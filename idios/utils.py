@@ -7,11 +7,86 @@ This file was pulled from django-profiles as it made the most sense. Slightly
 modified for Eldarion standards.
 
 """
+import zlib
+
 from django import forms
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
 
 from django.contrib.auth.models import SiteProfileNotAvailable
 
 
+# (profile modules list, {profile_slug: model}) as of the last build
+_profile_registry = (None, {})
+
+# {(profile model, exclude, fields): form class}
+_profile_form_cache = {}
+
+# {profile model: [(name, db field, form field, is text field), ...]}
+_required_fields_cache = {}
+
+
+def build_profile_registry(profile_modules):
+    """
+    Build and install the mapping of profile slugs to profile model
+    classes for the given list of profile modules.
+
+    Raise ``django.core.exceptions.ImproperlyConfigured`` if two
+    different models share the same ``profile_slug``.
+
+    """
+    global _profile_registry
+    registry = {}
+    for model in profile_modules:
+        if model is None:
+            continue
+        slug = model.profile_slug
+        if slug in registry and registry[slug] is not model:
+            raise ImproperlyConfigured(
+                "Profile slug '{0}' is used by both {1} and {2}".format(
+                    slug, registry[slug].__name__, model.__name__
+                )
+            )
+        registry[slug] = model
+    _profile_registry = (profile_modules, registry)
+    return registry
+
+
+def get_profile_registry():
+    """
+    Return the mapping of profile slugs to profile model classes for
+    the current ``IDIOS_PROFILE_MODULES`` setting, rebuilding it if the
+    setting has been replaced since it was last built.
+
+    """
+    from .conf import settings
+    profile_modules, registry = _profile_registry
+    if profile_modules is not settings.IDIOS_PROFILE_MODULES:
+        registry = build_profile_registry(settings.IDIOS_PROFILE_MODULES)
+    return registry
+
+
+def reset_profile_registry():
+    """
+    Discard the profile slug registry so it is rebuilt on next use.
+
+    """
+    global _profile_registry
+    _profile_registry = (None, {})
+
+
+def get_real_model(model):
+    """
+    Return ``model``, or the model it was derived from if it is one of
+    the classes Django creates for instances loaded with ``only()`` or
+    ``defer()``.
+
+    """
+    if getattr(model, "_deferred", False):
+        return model._meta.proxy_for_model
+    return model
+
+
 def get_profile_base():
     """
     Return a profile model class which is a concrete base class for
@@ -58,32 +133,194 @@ def get_profile_model(profile_slug=None):
 
     """
     from .conf import settings
-    model = None
-    if profile_slug is None and len(settings.IDIOS_PROFILE_MODULES) > 0:
+    if profile_slug is None:
+        if len(settings.IDIOS_PROFILE_MODULES) == 0:
+            raise SiteProfileNotAvailable
         model = settings.IDIOS_PROFILE_MODULES[0]
         if model is None:
             raise SiteProfileNotAvailable
-    else:
-        for model in settings.IDIOS_PROFILE_MODULES:
-            if model and profile_slug == model.profile_slug:
-                break
-    if model is None:
-        raise SiteProfileNotAvailable
-    return model
+        return model
+    return get_profile_registry().get(profile_slug)
+
+
+def prefetch_profiles(users, profile_types=None):
+    """
+    Load the profiles of all given ``users`` with one query per profile
+    type and attach them to the user objects, where
+    ``get_user_profile`` (and, for the default profile model,
+    ``User.get_profile``) will find them without further queries.
+
+    ``profile_types`` defaults to all models in
+    ``IDIOS_PROFILE_MODULES``. Return the users as a list.
+
+    """
+    from .conf import settings
+    users = list(users)
+    if profile_types is None:
+        profile_types = [m for m in settings.IDIOS_PROFILE_MODULES if m is not None]
+    default_model = get_profile_model() if settings.IDIOS_PROFILE_MODULES else None
+    users_by_id = {}
+    for user in users:
+        users_by_id[user.pk] = user
+        if not hasattr(user, "_idios_profile_cache"):
+            user._idios_profile_cache = {}
+    if not users_by_id:
+        return users
+    for model in profile_types:
+        user_cache_name = model._meta.get_field("user").get_cache_name()
+        for user in users:
+            user._idios_profile_cache.setdefault(model.profile_slug, None)
+        for profile in model.objects.filter(user__in=list(users_by_id)):
+            user = users_by_id[profile.user_id]
+            setattr(profile, user_cache_name, user)
+            if user._idios_profile_cache[model.profile_slug] is None:
+                user._idios_profile_cache[model.profile_slug] = profile
+                if model is default_model:
+                    user._profile_cache = profile
+    return users
+
+
+def get_user_profile(user, profile_model=None):
+    """
+    Return the profile of the given type (the default profile model if
+    not given) belonging to ``user``, or None if there is none. Profiles
+    attached by ``prefetch_profiles`` are used without querying.
+
+    """
+    if profile_model is None:
+        profile_model = get_profile_model()
+    cache = getattr(user, "_idios_profile_cache", None)
+    if cache is None:
+        cache = user._idios_profile_cache = {}
+    slug = profile_model.profile_slug
+    if slug not in cache:
+        prefetch_profiles([user], [profile_model])
+    return cache[slug]
 
 
-def get_profile_form(profile_model=None):
+def get_profile_form(profile_model=None, exclude=None, fields=None):
     """
     Return a form class (a subclass of the default ``ModelForm``)
     suitable for creating/editing instances of the given user profile
     model.
 
+    ``exclude`` defaults to ``["user"]`` as the user is filled in by
+    the view. Form classes are built once per combination of model,
+    ``exclude`` and ``fields`` and reused on subsequent calls; see
+    ``reset_profile_form_cache``.
+
     """
     if profile_model is None:
         profile_model = get_profile_model()
+    if exclude is None:
+        exclude = ["user"]
+    key = (
+        profile_model,
+        tuple(exclude),
+        tuple(fields) if fields is not None else None,
+    )
+    try:
+        return _profile_form_cache[key]
+    except KeyError:
+        pass
+
+    meta_attrs = {"model": profile_model, "exclude": list(exclude)}
+    if fields is not None:
+        meta_attrs["fields"] = list(fields)
+    Meta = type("Meta", (object,), meta_attrs)
+    form_class = type("_ProfileForm", (forms.ModelForm,), {"Meta": Meta})
+    _profile_form_cache[key] = form_class
+    return form_class
+
+
+def reset_profile_form_cache(profile_model=None):
+    """
+    Discard cached profile form classes, either for the given profile
+    model only or for all models.
+
+    """
+    if profile_model is None:
+        _profile_form_cache.clear()
+        return
+    for key in list(_profile_form_cache):
+        if key[0] is profile_model:
+            del _profile_form_cache[key]
+
+
+def get_required_fields(profile):
+    """
+    Return the required field metadata for the model of ``profile``,
+    resolved from its ``idios_required_fields()`` once per model: a list
+    of ``(name, model field, form field, is text field)`` tuples.
+
+    """
+    model = get_real_model(type(profile))
+    try:
+        return _required_fields_cache[model]
+    except KeyError:
+        pass
+    required_fields = []
+    for field in profile.idios_required_fields():
+        name = isinstance(field, tuple) and field[0] or field
+        db_field = profile._meta.get_field(name)
+        form_field = isinstance(field, tuple) and field[1] or db_field.formfield()
+        is_text = isinstance(db_field, (models.CharField, models.TextField))
+        required_fields.append((name, db_field, form_field, is_text))
+    _required_fields_cache[model] = required_fields
+    return required_fields
+
+
+def get_missing_fields_mask(profile):
+    """
+    Return a bitmask of the required fields ``profile`` has no value
+    for, bit ``n`` standing for the ``n``-th field returned by
+    ``get_required_fields``.
+
+    """
+    mask = 0
+    for i, (name, db_field, form_field, is_text) in enumerate(get_required_fields(profile)):
+        value = getattr(profile, db_field.attname)
+        if is_text:
+            missing = not value
+        else:
+            missing = value is None
+        if missing:
+            mask |= 1 << i
+    return mask
+
+
+def get_required_fields_key(profile):
+    """
+    Return a fingerprint of the names and order of the fields returned
+    by ``get_required_fields``. A mask stored along with a different key
+    was computed for another list of required fields.
+
+    """
+    names = ",".join(field[0] for field in get_required_fields(profile))
+    return zlib.crc32(names.encode("utf-8")) & 0x7fffffff
+
+
+def update_missing_fields_mask(profile):
+    """
+    Compute and set the mask of the missing required fields of
+    ``profile`` and the key of the fields it was computed for.
+
+    """
+    profile.missing_fields_mask = get_missing_fields_mask(profile)
+    profile.missing_fields_key = get_required_fields_key(profile)
+
 
-    class _ProfileForm(forms.ModelForm):
-        class Meta:
-            model = profile_model
-            exclude = ["user"]  # user will be filled in by the view.
-    return _ProfileForm
+def get_missing_fields(profile):
+    """
+    Return the names of the required fields ``profile`` has no value
+    for, read from the mask stored when it was saved if it was computed
+    for the current required fields.
+
+    """
+    mask = profile.missing_fields_mask
+    if mask is None or profile.missing_fields_key != get_required_fields_key(profile):
+        mask = get_missing_fields_mask(profile)
+    return [
+        field[0] for i, field in enumerate(get_required_fields(profile))
+        if mask & (1 << i)
+    ]
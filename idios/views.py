@@ -1,20 +1,98 @@
+import hashlib
 import json
 
-from django.http import HttpResponse, Http404, HttpResponseRedirect
+from calendar import timegm
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import (
+    HttpResponse, Http404, HttpResponseRedirect, QueryDict, StreamingHttpResponse
+)
 from django.shortcuts import get_object_or_404
 from django.template import RequestContext
 from django.template.loader import render_to_string
+from django.utils.encoding import force_bytes
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
 from django.views.generic import ListView, DetailView, CreateView, UpdateView
 
-from django.contrib.auth.models import User
-
 from account.mixins import LoginRequiredMixin
 
+from .cache import get_profile_versions
 from .conf import settings
+from .counts import get_profile_count
+from .pagination import CursorPaginator, InvalidCursor
+from .routers import pin_primary
+from .search import get_search_backend
 from .utils import get_profile_model, get_profile_base
+from .visibility import get_visibility
 
 
-class ProfileListView(ListView):
+class ConditionalGetMixin(object):
+    """
+    Answer conditional GET requests (``If-None-Match`` and
+    ``If-Modified-Since``) with 304 Not Modified, from the validators
+    returned by ``get_validators`` before the view renders anything.
+    Other requests are not charged for the validators: their responses
+    carry those returned by ``get_response_validators``, which only
+    reuses what the view loaded while rendering.
+
+    The idios views derive their ETags from the profile versions kept
+    in the card cache (see ``idios.cache``) and give no validators when
+    card caching is disabled.
+    """
+
+    def get_validators(self):
+        """
+        Return ``(etag, last_modified)`` for the current request, from
+        the cache or a cheap metadata query; either may be None.
+        """
+        return None, None
+
+    def get_response_validators(self):
+        """
+        Return ``(etag, last_modified)`` for a full response, or None for
+        either if it would take another query.
+        """
+        return None, None
+
+    def make_etag(self, *parts):
+        parts = [self.request.get_full_path(), self.request.user.pk] + list(parts)
+        return hashlib.md5(force_bytes(repr(parts))).hexdigest()
+
+    def is_conditional(self):
+        return (
+            "HTTP_IF_NONE_MATCH" in self.request.META or
+            "HTTP_IF_MODIFIED_SINCE" in self.request.META
+        )
+
+    def set_validators(self, response, etag, last_modified):
+        if etag is not None and not response.has_header("ETag"):
+            response["ETag"] = quote_etag(etag)
+        if last_modified is not None and not response.has_header("Last-Modified"):
+            response["Last-Modified"] = http_date(timegm(last_modified.utctimetuple()))
+
+    def dispatch(self, request, *args, **kwargs):
+        if not self.is_conditional():
+            response = super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs)
+            if request.method in ("GET", "HEAD") and response.status_code == 200:
+                self.set_validators(response, *self.get_response_validators())
+            return response
+
+        validators = {}
+
+        def get_validators():
+            if not validators:
+                validators["etag"], validators["last_modified"] = self.get_validators()
+            return validators
+
+        view = condition(
+            etag_func=lambda request, *args, **kwargs: get_validators()["etag"],
+            last_modified_func=lambda request, *args, **kwargs: get_validators()["last_modified"],
+        )(super(ConditionalGetMixin, self).dispatch)
+        return view(request, *args, **kwargs)
+
+
+class ProfileListView(ConditionalGetMixin, ListView):
     """
     List all profiles of a given type (or the default type, if
     profile_slug is not given.)
@@ -24,6 +102,12 @@ class ProfileListView(ListView):
     template_name = "idios/profiles.html"
     context_object_name = "profiles"
     all_profiles = False
+    cursor_pagination = False
+    cursor_kwarg = "cursor"
+    orderings = {
+        "date": ("-user__date_joined", "-pk"),
+        "name": ("user__username", "pk"),
+    }
 
     def get_model_class(self):
         profile_slug = self.kwargs.get("profile_slug", None)
@@ -39,21 +123,101 @@ class ProfileListView(ListView):
         return profile_class
 
     def get_queryset(self):
-        profiles = self.get_model_class().objects.select_related()
-        profiles = profiles.order_by("-date_joined")
+        # built once per request, for the validators and the page alike
+        if getattr(self, "_queryset", None) is not None:
+            return self._queryset
+
+        profile_class = self.get_model_class()
+        profiles = profile_class.objects.select_related(*profile_class.list_select_related)
+        visible = get_visibility(self.request).filter(profiles)
+        # whether the list is a subset of the profile type, which rules
+        # out using the stored per-type count
+        self.filtered = visible is not profiles
+        profiles = visible
+        fields = profile_class.get_list_fields()
+        if fields is not None:
+            profiles = profiles.only(*fields)
 
         search_terms = self.request.GET.get("search", "")
         order = self.request.GET.get("order", "date")
 
         if search_terms:
-            profiles = profiles.filter(user__username__icontains=search_terms)
-        if order == "date":
-            profiles = profiles.order_by("-user__date_joined")
-        elif order == "name":
-            profiles = profiles.order_by("user__username")
+            profiles = get_search_backend().filter(profiles, search_terms)
+            self.filtered = True
+        profiles = profiles.order_by(*self.orderings.get(order, self.orderings["date"]))
 
+        self._queryset = profiles
         return profiles
 
+    def get_count(self, queryset):
+        """
+        Return the stored count of the listed profile type when the list
+        is not filtered, or None to count rows.
+        """
+        if getattr(self, "filtered", True):
+            return None
+        return get_profile_count(queryset.model)
+
+    def get_paginator(self, queryset, *args, **kwargs):
+        paginator = super(ProfileListView, self).get_paginator(queryset, *args, **kwargs)
+        count = self.get_count(queryset)
+        if count is not None:
+            paginator._count = count
+        return paginator
+
+    def get_profile_slugs(self):
+        """
+        Return the slugs of the profile types whose versions identify
+        the listed profiles.
+        """
+        slugs = set([self.get_model_class().profile_slug])
+        if self.all_profiles:
+            slugs.update(m.profile_slug for m in settings.IDIOS_PROFILE_MODULES if m is not None)
+        return sorted(slugs)
+
+    def get_validators(self):
+        # the versions change with every profile save and delete and with
+        # renames, which MAX(modified) does not reflect; hence no
+        # Last-Modified either
+        versions = get_profile_versions(self.get_profile_slugs())
+        if versions is None:
+            return None, None
+        return self.make_etag(versions), None
+
+    def get_response_validators(self):
+        return self.get_validators()
+
+    def paginate_queryset(self, queryset, page_size):
+        """
+        With ``cursor_pagination`` enabled, page by seeking past the
+        ordering key given in the ``cursor`` query parameter instead of
+        using an ``OFFSET``. The paginator and page slots of the return
+        value are ``None`` in that mode; the cursors are placed in the
+        context by ``get_context_data``.
+        """
+        if not self.cursor_pagination:
+            return super(ProfileListView, self).paginate_queryset(queryset, page_size)
+        order = self.request.GET.get("order", "date")
+        ordering = self.orderings.get(order, self.orderings["date"])
+        paginator = CursorPaginator(queryset, page_size, ordering)
+        try:
+            object_list, previous_cursor, next_cursor = paginator.page(
+                self.request.GET.get(self.cursor_kwarg)
+            )
+        except InvalidCursor:
+            raise Http404("Invalid cursor")
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+        is_paginated = previous_cursor is not None or next_cursor is not None
+        return (None, None, object_list, is_paginated)
+
+    def get_cursor_query(self, cursor):
+        if cursor is None:
+            return None
+        GET = self.request.GET.copy()
+        GET[self.cursor_kwarg] = cursor
+        return GET.urlencode()
+
     def get_context_data(self, **kwargs):
         search_terms = self.request.GET.get("search", "")
         order = self.request.GET.get("order", "date")
@@ -64,35 +228,164 @@ class ProfileListView(ListView):
         }
         ctx.update(super(ProfileListView, self).get_context_data(**kwargs))
 
+        if self.cursor_pagination:
+            previous_cursor = getattr(self, "previous_cursor", None)
+            next_cursor = getattr(self, "next_cursor", None)
+            ctx.update({
+                "previous_cursor": previous_cursor,
+                "next_cursor": next_cursor,
+                "previous_cursor_query": self.get_cursor_query(previous_cursor),
+                "next_cursor_query": self.get_cursor_query(next_cursor),
+            })
+
         return ctx
 
 
-class ProfileDetailView(DetailView):
+class ProfileListJSONView(ProfileListView):
+    """
+    Stream the profiles ``ProfileListView`` would list, with the same
+    search and ordering, as a JSON array of objects built from
+    ``values()`` rows rather than model instances. Rows are read
+    ``json_chunk_size`` at a time by keyset.
+    """
+    json_fields = None
+    json_chunk_size = 1000
+
+    def get_json_fields(self, profile_class):
+        if self.json_fields is not None:
+            return list(self.json_fields)
+        names = set(f.name for f in profile_class._meta.fields)
+        fields = ["pk", "user__username", "user__date_joined"]
+        fields.extend(
+            name for name in getattr(profile_class, "list_item_fields", [])
+            if name in names
+        )
+        return fields
+
+    def iter_json(self, rows):
+        encoder = DjangoJSONEncoder()
+        yield "["
+        first = True
+        for row in rows:
+            if not first:
+                yield ","
+            first = False
+            yield encoder.encode(row)
+        yield "]"
+
+    def get(self, request, *args, **kwargs):
+        profiles = self.get_queryset()
+        order = request.GET.get("order", "date")
+        paginator = CursorPaginator(
+            profiles, self.json_chunk_size, self.orderings.get(order, self.orderings["date"])
+        )
+        rows = paginator.iter_values(*self.get_json_fields(profiles.model))
+        return StreamingHttpResponse(self.iter_json(rows), content_type="application/json")
+
+
+class ProfileDetailView(ConditionalGetMixin, DetailView):
 
     template_name = "idios/profile.html"
     context_object_name = "profile"
 
-    def get_object(self):
+    def get_queryset(self):
+        """
+        Return the queryset the requested profile is looked up in. The
+        user is joined so the profile, its user and ``page_user`` come
+        from a single query; override to add project-specific
+        ``select_related``/``prefetch_related`` calls.
+        """
         profile_class = get_profile_model(self.kwargs.get("profile_slug"))
 
         if profile_class is None:
             raise Http404
 
-        if settings.IDIOS_USE_USERNAME:
-            self.page_user = get_object_or_404(User, username=self.kwargs["username"])
-            profile = get_object_or_404(profile_class, user=self.page_user)
-        else:
-            profile = get_object_or_404(profile_class, pk=self.kwargs["pk"])
-            self.page_user = profile.user
+        return profile_class.objects.select_related("user")
+
+    def get_profiles_queryset(self):
+        """
+        Return the queryset of all profiles of ``page_user`` placed in
+        the context as ``profiles``; override to add prefetches.
+        """
+        profiles = get_profile_base().objects.filter(user=self.page_user)
+        return get_visibility(self.request).filter(profiles)
+
+    def get_lookup(self):
+        if "username" in self.kwargs:
+            return {"user__username": self.kwargs["username"]}
+        return {"pk": self.kwargs["pk"]}
+
+    def get_profile_slugs(self):
+        """
+        Return the slugs of the profile types shown on the page.
+        """
+        slugs = set(m.profile_slug for m in settings.IDIOS_PROFILE_MODULES if m is not None)
+        slugs.add(get_profile_base().profile_slug)
+        return sorted(slugs)
+
+    def get_validator_object(self):
+        """
+        Return the requested profile, loading only what its visibility
+        check needs unless the view already has it. Raise Http404 like
+        ``get_object``.
+        """
+        if getattr(self, "_profile", None) is not None:
+            return self._profile
+        profile = get_object_or_404(self.get_queryset().only("pk", "user"), **self.get_lookup())
+        if not get_visibility(self.request).is_visible(profile):
+            raise Http404
+        return profile
+
+    def get_validators(self):
+        try:
+            profile = self.get_validator_object()
+        except Http404:
+            # nothing is revealed about profiles the viewer cannot see
+            return None, None
+        # the card versions of all of the user's profiles change with any
+        # of them and with the user's name, which their modification times
+        # do not reflect; hence no Last-Modified either
+        versions = get_profile_versions(self.get_profile_slugs(), profile.user_id)
+        if versions is None:
+            return None, None
+        return self.make_etag(profile.pk, versions), None
+
+    def get_response_validators(self):
+        if getattr(self, "_profile", None) is None:
+            return None, None
+        return self.get_validators()
+
+    def get_object(self, queryset=None):
+        if queryset is None:
+            # looked up once per request, for the validators and the page alike
+            if getattr(self, "_profile", None) is not None:
+                return self._profile
+            queryset = self.get_queryset()
 
-        if not self.request.user.has_perm("can_view", obj=profile):
+        profile = get_object_or_404(queryset, **self.get_lookup())
+        self.page_user = profile.user
+
+        if not get_visibility(self.request).is_visible(profile):
             raise Http404
 
+        self._profile = profile
         return profile
 
+    def get_profiles(self):
+        """
+        Return ``get_profiles_queryset()``, evaluated once per request.
+        """
+        if getattr(self, "_profiles", None) is None:
+            profiles = self.get_profiles_queryset()
+            # evaluate now and share page_user so templates don't query per profile
+            user_cache_name = profiles.model._meta.get_field("user").get_cache_name()
+            for profile in profiles:
+                setattr(profile, user_cache_name, self.page_user)
+            self._profiles = profiles
+        return self._profiles
+
     def get_context_data(self, **kwargs):
-        base_profile_class = get_profile_base()
-        profiles = base_profile_class.objects.filter(user=self.page_user)
+        profiles = self.get_profiles()
 
         is_me = self.request.user == self.page_user
 
@@ -111,6 +404,11 @@ class ProfileCreateView(LoginRequiredMixin, CreateView):
     template_name = "idios/profile_create.html"
     template_name_ajax = "idios/profile_create_ajax.html"
 
+    def dispatch(self, request, *args, **kwargs):
+        # profiles are read to be written, so never from a lagging replica
+        pin_primary(request, sticky=False)
+        return super(ProfileCreateView, self).dispatch(request, *args, **kwargs)
+
     def get_template_names(self):
         if self.request.is_ajax():
             return [self.template_name_ajax]
@@ -133,6 +431,7 @@ class ProfileCreateView(LoginRequiredMixin, CreateView):
         profile.user = self.request.user
         profile.save()
         self.object = profile
+        pin_primary(self.request)
 
         return HttpResponseRedirect(self.get_success_url())
 
@@ -153,6 +452,12 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
     template_name_ajax = "idios/profile_edit_ajax.html"
     template_name_ajax_success = "idios/profile_edit_ajax_success.html"
     context_object_name = "profile"
+    partial_kwarg = "partial"
+
+    def dispatch(self, request, *args, **kwargs):
+        # profiles are read to be written, so never from a lagging replica
+        pin_primary(request, sticky=False)
+        return super(ProfileUpdateView, self).dispatch(request, *args, **kwargs)
 
     def get_template_names(self):
         if self.request.is_ajax():
@@ -169,8 +474,31 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
         if profile_class is None:
             raise Http404
 
+        if self.is_partial():
+            # only the submitted fields are validated (and written)
+            form_fields = profile_class.get_form().base_fields
+            data = self.get_form_kwargs().get("data", {})
+            return profile_class.get_form(fields=sorted(f for f in data if f in form_fields))
+
         return profile_class.get_form()
 
+    def is_partial(self):
+        """
+        Partial updates are requested with the PATCH method, or with a
+        POST carrying ``partial`` in the query string.
+        """
+        return self.request.method == "PATCH" or self.partial_kwarg in self.request.GET
+
+    def get_form_kwargs(self):
+        kwargs = super(ProfileUpdateView, self).get_form_kwargs()
+        if self.request.method == "PATCH":
+            # Django only parses request bodies of POST requests
+            kwargs["data"] = QueryDict(self.request.body, encoding=self.request.encoding)
+        return kwargs
+
+    def patch(self, request, *args, **kwargs):
+        return self.post(request, *args, **kwargs)
+
     def get_object(self, queryset=None):
         profile_class = get_profile_model(self.kwargs.get("profile_slug"))
 
@@ -186,7 +514,14 @@ class ProfileUpdateView(LoginRequiredMixin, UpdateView):
         return ctx
 
     def form_valid(self, form):
-        self.object = form.save()
+        if self.is_partial():
+            self.object = form.save(commit=False)
+            concrete_fields = set(f.name for f in self.object._meta.concrete_fields)
+            self.object.save(update_fields=[f for f in form.cleaned_data if f in concrete_fields])
+            form.save_m2m()
+        else:
+            self.object = form.save()
+        pin_primary(self.request)
         if self.request.is_ajax():
             data = {
                 "status": "success",
@@ -0,0 +1,99 @@
+"""
+Batched checks of the ``can_view`` object permission on profiles.
+
+Permissions are answered by the configured authentication backends, as
+with ``User.has_perm``. Backends may additionally implement either of
+
+``filter_objects(user_obj, perm, queryset)``
+    return ``queryset`` narrowed down to the objects ``user_obj`` has
+    ``perm`` on, used to filter profile lists in the database
+
+``has_perm_objects(user_obj, perm, objs)``
+    return the subset of ``objs`` ``user_obj`` has ``perm`` on, used to
+    check many profiles in one pass
+
+and otherwise fall back to per-object ``has_perm`` calls. Results are
+memoized for the lifetime of a ``ProfileVisibility`` instance, which
+``get_visibility`` keeps per request.
+
+"""
+from functools import reduce
+
+from django.contrib import auth
+
+
+VIEW_PERMISSION = "can_view"
+
+
+class ProfileVisibility(object):
+
+    def __init__(self, user, permission=VIEW_PERMISSION):
+        self.user = user
+        self.permission = permission
+        self._results = {}
+
+    def grants_all(self):
+        return self.user.is_active and self.user.is_superuser
+
+    def filter(self, queryset):
+        """
+        Return ``queryset`` narrowed down to the visible profiles, using
+        the backends implementing ``filter_objects``. Without any such
+        backend the queryset is returned unchanged.
+        """
+        if self.grants_all():
+            return queryset
+        filtered = [
+            backend.filter_objects(self.user, self.permission, queryset)
+            for backend in auth.get_backends() if hasattr(backend, "filter_objects")
+        ]
+        if not filtered:
+            return queryset
+        return reduce(lambda a, b: a | b, filtered)
+
+    def _key(self, profile):
+        return (type(profile), profile.pk)
+
+    def check(self, profiles):
+        """
+        Return the visible ones of ``profiles``, in order, checking all
+        profiles not seen before in one pass over the backends.
+        """
+        pending = [p for p in profiles if self._key(p) not in self._results]
+        if pending:
+            if self.grants_all():
+                visible = set(self._key(p) for p in pending)
+            else:
+                visible = set()
+                for backend in auth.get_backends():
+                    remaining = [p for p in pending if self._key(p) not in visible]
+                    if not remaining:
+                        break
+                    if hasattr(backend, "has_perm_objects"):
+                        granted = backend.has_perm_objects(self.user, self.permission, remaining)
+                    elif hasattr(backend, "has_perm"):
+                        granted = [
+                            p for p in remaining
+                            if backend.has_perm(self.user, self.permission, p)
+                        ]
+                    else:
+                        continue
+                    visible.update(self._key(p) for p in granted)
+            for profile in pending:
+                key = self._key(profile)
+                self._results[key] = key in visible
+        return [p for p in profiles if self._results[self._key(p)]]
+
+    def is_visible(self, profile):
+        return bool(self.check([profile]))
+
+
+def get_visibility(request):
+    """
+    Return the ``ProfileVisibility`` of ``request.user``, shared by all
+    checks made while handling ``request``.
+    """
+    visibility = getattr(request, "_idios_visibility", None)
+    if visibility is None or visibility.user is not request.user:
+        visibility = request._idios_visibility = ProfileVisibility(request.user)
+    return visibility
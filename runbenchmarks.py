@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+"""
+Benchmark idios views and helpers against an SQLite database seeded with
+users and profiles of the test models.
+
+    python runbenchmarks.py --scale 10k --scale 100k --output bench.json
+    python runbenchmarks.py --scale 10k --compare bench.json
+    python runbenchmarks.py --scale 1k --repeat 1  # smoke run, as on CI
+
+Each scale seeds the database up to that many users (scales run in
+increasing order and reuse the rows of the previous one), then reports
+the median and best latency and the query count of every scenario.
+
+"""
+from __future__ import print_function
+
+import json
+import optparse
+import os
+import sys
+import time
+
+import django
+
+from django.conf import settings
+
+
+SCALES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+
+DEFAULT_SETTINGS = dict(
+    INSTALLED_APPS=[
+        "django.contrib.auth",
+        "django.contrib.contenttypes",
+        "django.contrib.sessions",
+        "django.contrib.sites",
+        "account",
+        "idios",
+        "idios.tests",
+    ],
+    MIDDLEWARE_CLASSES=[
+        "django.middleware.common.CommonMiddleware",
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.contrib.auth.middleware.AuthenticationMiddleware",
+    ],
+    IDIOS_PROFILE_MODULES=[
+        "idios.tests.models.SimpleProfile",
+        "idios.tests.models.SecretIdentityProfile",
+    ],
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    SITE_ID=1,
+    ROOT_URLCONF="benchmarks.urls",
+    TEMPLATE_DIRS=[os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "templates")],
+    SECRET_KEY="notasecret",
+    # the test client's requests come from "testserver"
+    ALLOWED_HOSTS=["*"],
+    AUTH_PROFILE_MODULE="tests.SimpleProfile",
+)
+
+CHUNK_SIZE = 5000
+
+
+def setup(database):
+    parent = os.path.dirname(os.path.abspath(__file__))
+    sys.path.insert(0, parent)
+
+    settings.configure(DATABASES={
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": database,
+        }
+    }, **DEFAULT_SETTINGS)
+
+    # Compatibility with Django 1.7's stricter initialization
+    if hasattr(django, "setup"):
+        django.setup()
+
+    from django.core.management import call_command
+    try:
+        call_command("migrate", interactive=False, verbosity=0)
+    except Exception:
+        call_command("syncdb", interactive=False, verbosity=0)
+
+
+def seed(total):
+    """
+    Add users, with a SimpleProfile each, until there are ``total``; every
+    tenth user also gets a SecretIdentityProfile and every hundredth a
+    SecretVillainProfile.
+    """
+    import datetime
+
+    from django.db import connection, transaction
+
+    from django.contrib.auth.models import User
+
+    from idios.counts import reconcile_profile_counts
+    from idios.models import ProfileSearchToken
+    from idios.search import tokenize
+    from idios.tests.models import SimpleProfile, SecretIdentityProfile, SecretVillainProfile
+
+    start = User.objects.count()
+    epoch = datetime.datetime(2010, 1, 1)
+    villain_table = SecretVillainProfile._meta.db_table
+    villain_ptr = SecretVillainProfile._meta.pk.column
+    for offset in range(start, total, CHUNK_SIZE):
+        numbers = range(offset, min(offset + CHUNK_SIZE, total))
+        with transaction.atomic():
+            User.objects.bulk_create([
+                User(
+                    username="user{0}".format(n),
+                    email="user{0}@example.com".format(n),
+                    date_joined=epoch + datetime.timedelta(minutes=n),
+                )
+                for n in numbers
+            ])
+            user_ids = dict(
+                User.objects.filter(
+                    username__in=["user{0}".format(n) for n in numbers]
+                ).values_list("username", "pk")
+            )
+            SimpleProfile.objects.bulk_create([
+                SimpleProfile(user_id=user_ids["user{0}".format(n)], name="User {0}".format(n))
+                for n in numbers
+            ])
+            SecretIdentityProfile.objects.bulk_create([
+                SecretIdentityProfile(user_id=user_ids["user{0}".format(n)], super_power="flight")
+                for n in numbers if n % 10 == 0
+            ])
+            villain_parents = SecretIdentityProfile.objects.filter(
+                user__in=[user_ids["user{0}".format(n)] for n in numbers if n % 100 == 0]
+            ).values_list("pk", flat=True)
+            connection.cursor().executemany(
+                "INSERT INTO {0} ({1}, fiendish_plot) VALUES (%s, %s)".format(villain_table, villain_ptr),
+                [(pk, "world domination") for pk in villain_parents]
+            )
+            ProfileSearchToken.objects.bulk_create([
+                ProfileSearchToken(user_id=user_ids[username], token=token)
+                for username in user_ids
+                for token in set(tokenize(username) + [username.lower()])
+            ])
+    reconcile_profile_counts([SimpleProfile, SecretIdentityProfile, SecretVillainProfile])
+
+
+def measure(func, repeat):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    queries = 0
+    for i in range(repeat):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.time()
+            func(i)
+            timings.append(time.time() - started)
+        queries = len(ctx.captured_queries)
+    timings.sort()
+    return {
+        "median_ms": timings[len(timings) // 2] * 1000,
+        "best_ms": timings[0] * 1000,
+        "queries": queries,
+    }
+
+
+def measure_calls(func, calls):
+    started = time.time()
+    for i in range(calls):
+        func()
+    return {
+        "median_ms": (time.time() - started) * 1000 / calls,
+        "best_ms": None,
+        "queries": 0,
+    }
+
+
+def check(response, status=200):
+    if response.status_code != status:
+        raise AssertionError("{0} returned {1}".format(response.request["PATH_INFO"], response.status_code))
+    return response
+
+
+def run_scenarios(total, repeat):
+    from django.core.urlresolvers import reverse
+    from django.test.client import Client, RequestFactory
+
+    from django.contrib.auth.models import User
+    from django.contrib.sessions.backends.db import SessionStore
+
+    from idios.conf import settings as idios_settings
+    from idios.middleware import AdditionalInfoMiddleware
+    from idios.models import skip_profile_creation
+    from idios.pagination import encode_cursor
+    from idios.tests.models import SimpleProfile, SecretIdentityProfile
+    from idios.utils import get_profile_form, get_profile_model
+
+    admin, created = User.objects.get_or_create(username="bench-admin", defaults={
+        "is_superuser": True, "is_staff": True,
+    })
+    if created:
+        admin.set_password("bench")
+        admin.save()
+    client = Client()
+    client.login(username="bench-admin", password="bench")
+
+    results = {}
+    list_url = reverse("bench_list_paged")
+    last_page = (SimpleProfile.objects.count() + 19) // 20
+    deep = SimpleProfile.objects.select_related("user").order_by(
+        "-user__date_joined", "-pk"
+    )[total - total // 50]
+    deep_cursor = encode_cursor("next", deep.user.date_joined, deep.pk)
+    detail_user = "user{0}".format(total // 2)
+
+    scenarios = [
+        ("list", lambda i: check(client.get(list_url))),
+        ("list_order_name", lambda i: check(client.get(list_url, {"order": "name"}))),
+        ("list_search", lambda i: check(client.get(list_url, {"search": "user{0}".format(total // 3)}))),
+        ("list_secret", lambda i: check(client.get(reverse("bench_list_paged", kwargs={"profile_slug": "secret"})))),
+        ("list_page_last", lambda i: check(client.get(list_url, {"page": last_page}))),
+        ("list_cursor_first", lambda i: check(client.get(reverse("bench_list_cursor")))),
+        ("list_cursor_deep", lambda i: check(client.get(reverse("bench_list_cursor"), {"cursor": deep_cursor}))),
+        ("list_json", lambda i: b"".join(check(client.get(reverse("profile_list_json"))).streaming_content)),
+        ("detail", lambda i: check(client.get(reverse("profile_detail", kwargs={"username": detail_user})))),
+        ("update", lambda i: check(client.post(reverse("profile_edit"), {"name": "Admin {0}".format(i)}), 302)),
+        ("update_partial", lambda i: check(
+            client.post(reverse("profile_edit") + "?partial", {"name": "Admin p{0}".format(i)}), 302
+        )),
+    ]
+    for name, func in scenarios:
+        results[name] = measure(func, repeat)
+
+    # create: every iteration posts as a fresh, signed in user without a secret profile
+    with skip_profile_creation():
+        creators = []
+        for i in range(repeat):
+            user, created = User.objects.get_or_create(username="bench-creator-{0}-{1}".format(total, i))
+            user.set_password("bench")
+            user.save()
+            SecretIdentityProfile.objects.filter(user=user).delete()
+            creator = Client()
+            creator.login(username=user.username, password="bench")
+            creators.append(creator)
+    create_url = reverse("profile_create", kwargs={"profile_slug": "secret"})
+
+    def create(i):
+        check(creators[i].post(create_url, {"super_power": "invisibility"}), 302)
+    results["create"] = measure(create, repeat)
+
+    results["get_profile_model"] = measure_calls(lambda: get_profile_model("secret"), 10000)
+    results["get_profile_form"] = measure_calls(lambda: get_profile_form(SecretIdentityProfile), 10000)
+
+    factory = RequestFactory()
+    middleware = AdditionalInfoMiddleware()
+    anonymous_request = factory.get("/profiles/")
+    results["middleware_no_session"] = measure_calls(
+        lambda: middleware.process_request(anonymous_request), 10000
+    )
+
+    session = SessionStore()
+    session["idios_additional_info_kickstart"] = True
+    session.save()
+
+    def kickstart(i):
+        request = factory.get("/profiles/")
+        request.COOKIES[idios_settings.SESSION_COOKIE_NAME] = session.session_key
+        request.session = SessionStore(session.session_key)
+        request.user = admin
+        request._dont_enforce_csrf_checks = True
+        middleware.process_request(request)
+    results["middleware_kickstart"] = measure(kickstart, repeat)
+    return results
+
+
+def report(total, results, previous=None):
+    print("\n{0} users".format(total))
+    print("{0:<24} {1:>12} {2:>12} {3:>8} {4:>10}".format("scenario", "median ms", "best ms", "queries", "change"))
+    for name in sorted(results):
+        result = results[name]
+        change = ""
+        if previous and name in previous:
+            before = previous[name]["median_ms"]
+            if before:
+                change = "{0:+.1f}%".format((result["median_ms"] - before) * 100.0 / before)
+        print("{0:<24} {1:>12.3f} {2:>12} {3:>8} {4:>10}".format(
+            name,
+            result["median_ms"],
+            "-" if result["best_ms"] is None else "{0:.3f}".format(result["best_ms"]),
+            result["queries"],
+            change,
+        ))
+
+
+def runbenchmarks(argv):
+    parser = optparse.OptionParser(usage="%prog [options]")
+    parser.add_option(
+        "--scale", action="append", dest="scales", choices=sorted(SCALES),
+        help="Number of users to seed: 1k, 10k, 100k or 1m. May be repeated (default: 10k)."
+    )
+    parser.add_option(
+        "--repeat", type="int", dest="repeat", default=20,
+        help="Runs per scenario (default: 20)."
+    )
+    parser.add_option(
+        "--database", dest="database", default=":memory:",
+        help="SQLite database file to seed, reused between runs (default: in memory)."
+    )
+    parser.add_option("--output", dest="output", help="Save the results as JSON to this file.")
+    parser.add_option("--compare", dest="compare", help="Compare with results saved by --output.")
+    options, args = parser.parse_args(argv)
+
+    setup(options.database)
+
+    previous = {}
+    if options.compare:
+        with open(options.compare) as fp:
+            previous = json.load(fp)
+
+    all_results = {}
+    for scale in sorted(options.scales or ["10k"], key=SCALES.get):
+        total = SCALES[scale]
+        started = time.time()
+        seed(total)
+        print("seeded {0} users in {1:.1f}s".format(total, time.time() - started))
+        results = run_scenarios(total, options.repeat)
+        report(total, results, previous.get(scale))
+        all_results[scale] = results
+
+    if options.output:
+        with open(options.output, "w") as fp:
+            json.dump(all_results, fp, indent=2, sort_keys=True)
+
+
+if __name__ == "__main__":
+    runbenchmarks(sys.argv[1:])
@@ -25,7 +25,12 @@ DEFAULT_SETTINGS = dict(
         "default": {
             "ENGINE": "django.db.backends.sqlite3",
             "NAME": ":memory:",
-        }
+        },
+        # a second, unreplicated database for the read routing tests
+        "replica": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": ":memory:",
+        },
     },
     # IDIOS_PROFILE_MODULES=["idios.tests.models.SimpleProfile"],
     SITE_ID=1,
@@ -21,7 +21,7 @@ setup(
         "django-user-accounts>=1.0c9",
     ],
     test_suite="runtests.runtests",
-    packages=find_packages(),
+    packages=find_packages(exclude=["benchmarks"]),
     classifiers=[
         "Development Status :: 3 - Alpha",
         "Environment :: Web Environment",